@@ -1,3 +1,6 @@
+import falcon
+
+
 class ApiException(Exception):
     """
     Base class for all API exceptions.
@@ -10,3 +13,19 @@ class ParamException(ApiException):
     Should be raised in custom clean methods when value is invalid.
     """
     pass
+
+
+class StatementBudgetException(ApiException, falcon.HTTPError):
+    """
+    Raised when a request executes more SQL statements than allowed. The same request would exceed the budget again,
+    so it's rendered as a `400 Bad Request` response, not one that could be retried.
+    """
+    def __init__(self, description, status=falcon.HTTP_BAD_REQUEST):
+        """
+        :param description: details of the error
+        :type description: str
+
+        :param status: HTTP status code
+        :type status: str
+        """
+        falcon.HTTPError.__init__(self, status, title='Statement budget exceeded', description=description)
@@ -1,3 +1,3 @@
 """
-Auth and content negotiation middlewares.
+Auth, content negotiation and SQL instrumentation middlewares.
 """
@@ -5,6 +5,11 @@ except ImportError:
 import falcon
 import logging
 
+from falcon_dbapi.resources.base import RawJSON
+
+# newline delimited JSON, a document in every line, decoded as a list of documents
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
 
 class RequireJSON(object):
     """
@@ -24,7 +29,8 @@ class RequireJSON(object):
                 href='http://docs.examples.com/api/json')
 
         if req.method in ('POST', 'PUT', 'PATCH'):
-            if req.content_type is None or 'application/json' not in req.content_type:
+            if req.content_type is None or ('application/json' not in req.content_type and
+                                            NDJSON_CONTENT_TYPE not in req.content_type):
                 raise falcon.HTTPUnsupportedMediaType(
                     'This API only supports requests encoded as JSON.',
                     href='http://docs.examples.com/api/json')
@@ -36,7 +42,7 @@ class JSONTranslator(object):
     """
     def process_request(self, req, resp):
         """
-        Converts request input data from JSON to a dict.
+        Converts request input data from JSON to a dict, or from newline delimited JSON to a list.
         :param req: Falcon request
         :type req: falcon.request.Request
 
@@ -51,13 +57,33 @@ class JSONTranslator(object):
             # Nothing to do
             return
 
-        body = req.stream.read()
+        self._load_body(req, req.stream.read())
+
+    async def process_request_async(self, req, resp):
+        """
+        Same as :func:`process_request`, used by Falcon ASGI apps.
+        :param req: Falcon request
+        :type req: falcon.asgi.Request
+
+        :param resp: Falcon response
+        :type resp: falcon.asgi.Response
+        """
+        if req.content_length in (None, 0):
+            return
+
+        self._load_body(req, await req.stream.read())
+
+    @staticmethod
+    def _load_body(req, body):
         if not body:
             raise falcon.HTTPBadRequest('Empty request body',
                                         'A valid JSON document is required.')
 
         try:
-            req.context['doc'] = json.loads(body.decode('utf-8'))
+            if req.content_type and NDJSON_CONTENT_TYPE in req.content_type:
+                req.context['doc'] = [json.loads(line) for line in body.decode('utf-8').splitlines() if line.strip()]
+            else:
+                req.context['doc'] = json.loads(body.decode('utf-8'))
 
         except (ValueError, UnicodeDecodeError):
             raise falcon.HTTPError(falcon.HTTP_753,
@@ -81,9 +107,16 @@ class JSONTranslator(object):
         :param req_succeeded:
         :type req_succeeded: bool
         """
-        if req_succeeded:
+        # streamed responses are already encoded
+        if req_succeeded and not isinstance(resp.body, RawJSON) and (resp.body is not None or resp.stream is None):
             resp.body = json.dumps(resp.body)
 
+    async def process_response_async(self, req, resp, resource, req_succeeded):
+        """
+        Same as :func:`process_response`, used by Falcon ASGI apps.
+        """
+        self.process_response(req, resp, resource, req_succeeded)
+
 
 class JsonError(Exception):
     """
@@ -0,0 +1,184 @@
+from collections import Counter
+import contextvars
+import logging
+import threading
+import time
+
+import falcon
+from sqlalchemy import event
+
+from falcon_dbapi.exceptions import StatementBudgetException
+
+
+class StatementStats(object):
+    """
+    SQL statements executed while handling a single request.
+    """
+    def __init__(self, budget=None):
+        """
+        :param budget: max number of statements, None disables checking
+        :type budget: int | None
+        """
+        self.budget = budget
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+        # statements of a request can be executed by many threads, like when querying shards
+        self.lock = threading.Lock()
+
+    def add(self, statement):
+        """
+        Counts an executed statement.
+
+        :param statement: SQL statement
+        :type statement: str
+
+        :return: number of statements executed so far
+        :rtype: int
+        """
+        with self.lock:
+            self.count += 1
+            self.shapes[statement] += 1
+            return self.count
+
+    def add_duration(self, duration):
+        """
+        :param duration: time spent executing a statement, in seconds
+        :type duration: float
+        """
+        with self.lock:
+            self.duration += duration
+
+    def most_repeated(self):
+        """
+        :return: the statement executed most times and how many times it was executed
+        :rtype: tuple[str | None, int]
+        """
+        if not self.shapes:
+            return None, 0
+        return self.shapes.most_common(1)[0]
+
+
+class StatementCounter(object):
+    """
+    Counts SQL statements executed by an engine and their total time for every request,
+    to detect lazy loading of relations (N+1 queries) and requests exceeding a statement budget.
+
+    The budget can be changed for a resource by setting its `max_statements` attribute.
+
+    Statistics are kept in a context variable, so statements executed in other threads are counted
+    only if they run in a copy of the request context, like :func:`contextvars.copy_context` returns.
+    """
+    HEADER_STATEMENTS = 'x-sql-statements'
+    HEADER_DURATION = 'x-sql-time'
+    HEADER_REPEATED = 'x-sql-repeated'
+
+    def __init__(self, db_engine, max_statements=None, max_repeats=None, raise_on_budget=False, debug=False):
+        """
+        :param db_engine: SQLAlchemy engine
+        :type db_engine: sqlalchemy.engine.Engine
+
+        :param max_statements: max number of statements in a request, None disables checking
+        :type max_statements: int | None
+
+        :param max_repeats: a warning is logged when the same statement is executed more times than this,
+                            None disables it
+        :type max_repeats: int | None
+
+        :param raise_on_budget: if True, exceeding the budget raises an exception instead of logging a warning
+        :type raise_on_budget: bool
+
+        :param debug: if True, statistics are returned in response headers
+                      and exceeding the budget is rendered as a server error
+        :type debug: bool
+        """
+        self.max_statements = max_statements
+        self.max_repeats = max_repeats
+        self.raise_on_budget = raise_on_budget
+        self.debug = debug
+        self._stats = contextvars.ContextVar('statement_stats_{}'.format(id(self)), default=None)
+        event.listen(db_engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(db_engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    @property
+    def stats(self):
+        """
+        :return: statistics of the current request or None outside of a request
+        :rtype: StatementStats | None
+        """
+        return self._stats.get()
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        stats = self.stats
+        if stats is None:
+            return
+        count = stats.add(statement)
+        if self.raise_on_budget and stats.budget is not None and count > stats.budget:
+            raise StatementBudgetException('Request executed more than {} SQL statements'.format(stats.budget),
+                                           falcon.HTTP_INTERNAL_SERVER_ERROR if self.debug else falcon.HTTP_BAD_REQUEST)
+        conn.info.setdefault('statement_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        stats = self.stats
+        if stats is None or not conn.info.get('statement_start'):
+            return
+        stats.add_duration(time.perf_counter() - conn.info['statement_start'].pop())
+
+    def process_request(self, req, resp):
+        """
+        :param req: Falcon request
+        :type req: falcon.request.Request
+
+        :param resp: Falcon response
+        :type resp: falcon.response.Response
+        """
+        self._stats.set(StatementStats(self.max_statements))
+
+    def process_resource(self, req, resp, resource, params):
+        """
+        :param req: Falcon request
+        :type req: falcon.request.Request
+
+        :param resp: Falcon response
+        :type resp: falcon.response.Response
+
+        :param resource:
+        :type resource: falcon_dbapi.resources.base.BaseResource
+
+        :param params: URI template field values
+        :type params: dict
+        """
+        self.stats.budget = getattr(resource, 'max_statements', self.max_statements)
+
+    def process_response(self, req, resp, resource, req_succeeded):
+        """
+        Logs warnings and sets debug headers.
+
+        :param req: Falcon request
+        :type req: falcon.request.Request
+
+        :param resp: Falcon response
+        :type resp: falcon.response.Response
+
+        :param resource:
+        :type resource: falcon_dbapi.resources.base.BaseResource
+
+        :param req_succeeded:
+        :type req_succeeded: bool
+        """
+        stats = self.stats
+        self._stats.set(None)
+        if stats is None:
+            return
+        logger = logging.getLogger()
+        statement, repeats = stats.most_repeated()
+        if stats.budget is not None and stats.count > stats.budget:
+            logger.warning('{} {} executed {} SQL statements, more than {}'.format(req.method, req.path, stats.count,
+                                                                                   stats.budget))
+        if self.max_repeats is not None and repeats > self.max_repeats:
+            logger.warning('{} {} executed the same SQL statement {} times, '
+                           'relations might be lazy loaded: {}'.format(req.method, req.path, repeats, statement))
+        if self.debug:
+            resp.set_headers({self.HEADER_STATEMENTS: str(stats.count),
+                              self.HEADER_DURATION: '{:.3f}'.format(stats.duration * 1000),
+                              self.HEADER_REPEATED: str(repeats)})
@@ -3,15 +3,49 @@ try:
 except ImportError:
     import json
 
+from collections import OrderedDict
+
 import falcon
 
 from falcon_dbapi.exceptions import ParamException
 
 
+class RawJSON(str):
+    """
+    A response body that is already encoded as JSON, so it's passed through by
+    :class:`falcon_dbapi.middlewares.json_middleware.JSONTranslator` without encoding it again.
+    """
+
+    @classmethod
+    def from_parts(cls, data, encoded):
+        """
+        Encodes a dict, adding values that are already encoded as JSON without decoding them first.
+
+        :param data: values to encode
+        :type data: dict
+
+        :param encoded: keys mapped to JSON strings
+        :type encoded: dict
+
+        :rtype: RawJSON
+        """
+        result = json.dumps(data)
+        if not encoded:
+            return cls(result)
+        parts = [json.dumps(key) + ':' + value for key, value in encoded.items()]
+        return cls(result[:-1] + (',' if data else '') + ','.join(parts) + '}')
+
+
 class BaseResource(object):
     """
     Base resource class that you would probably want to use to extend all of your other resources
     """
+    # limits of filters complexity, checked before building any queries, None disables a limit
+    MAX_FILTER_DEPTH = None
+    MAX_FILTER_CONDITIONS = None
+    # joined relations or nested fields in a single condition
+    MAX_FILTER_JOINS = None
+    MAX_FILTER_VALUES = None
 
     def __init__(self, objects_class):
         """
@@ -126,6 +160,71 @@ class BaseResource(object):
             return req.context['doc'].get(name, default)
         return default
 
+    def get_param_flag(self, req, name, pop_params=True):
+        """
+        Gets a boolean param from request params or body, accepting `1`, `true`, `yes`, `on` and `0`, `false`, `no`,
+        `off` or an empty value.
+
+        :param req: Falcon request
+        :type req: falcon.request.Request
+
+        :param name: param name
+        :type name: str
+
+        :param pop_params: if True, will pop from req params
+        :type pop_params: bool
+
+        :return: param value, False if not set
+        :rtype: bool
+        """
+        value = self.get_param_or_post(req, name, pop_params=pop_params)
+        if value is None or isinstance(value, bool):
+            return bool(value)
+        value = str(value).lower()
+        if value in ('1', 'true', 'yes', 'on'):
+            return True
+        if value in ('', '0', 'false', 'no', 'off'):
+            return False
+        raise falcon.HTTPBadRequest('Invalid attribute', 'Value of {} attribute must be a boolean'.format(name))
+
+    def check_filter_complexity(self, conditions, logical_operators):
+        """
+        Rejects filters exceeding `MAX_FILTER_DEPTH`, `MAX_FILTER_CONDITIONS` or `MAX_FILTER_VALUES`,
+        without parsing them.
+
+        :param conditions: conditions dictionary
+        :type conditions: dict
+
+        :param logical_operators: names of logical operators
+        :type logical_operators: collections.Container
+
+        :raises falcon.HTTPBadRequest: if any limit is exceeded
+        """
+        conditions_count = 0
+        stack = [(conditions, 0)]
+        while stack:
+            value, depth = stack.pop()
+            if isinstance(value, list):
+                stack.extend((item, depth) for item in value)
+                continue
+            if not isinstance(value, dict):
+                continue
+            for arg, subvalue in value.items():
+                if arg in logical_operators:
+                    if self.MAX_FILTER_DEPTH is not None and depth >= self.MAX_FILTER_DEPTH:
+                        raise falcon.HTTPBadRequest('Invalid attribute', 'Filters can\'t be nested deeper than {} '
+                                                                         'levels'.format(self.MAX_FILTER_DEPTH))
+                    stack.append((subvalue, depth + 1))
+                    continue
+                conditions_count += 1
+                if self.MAX_FILTER_CONDITIONS is not None and conditions_count > self.MAX_FILTER_CONDITIONS:
+                    raise falcon.HTTPBadRequest('Invalid attribute', 'Filters can\'t have more than {} '
+                                                                     'conditions'.format(self.MAX_FILTER_CONDITIONS))
+                if self.MAX_FILTER_VALUES is not None and isinstance(subvalue, list) \
+                        and len(subvalue) > self.MAX_FILTER_VALUES:
+                    raise falcon.HTTPBadRequest('Invalid attribute', 'Filter attribute {} can\'t have more than {} '
+                                                                     'values'.format(arg, self.MAX_FILTER_VALUES))
+
     def on_options(self, req, resp, **kwargs):
         """
         Returns allowed methods in the Allow HTTP header.
@@ -176,8 +275,15 @@ class BaseCollectionResource(BaseResource):
     PARAM_TOTALS = 'totals'
     PARAM_SEARCH = 'search'
     PARAM_TEXT_QUERY = 'q'
+    PARAM_SAMPLE = 'sample'
+    PARAM_SAMPLE_SEED = 'sample_seed'
     AGGR_GROUPBY = 'group_by'
     AGGR_GROUPLIMIT = 'group_limit'
+    AGGR_ROLLUP = 'rollup'
+    AGGR_APPROX_COUNT_DISTINCT = 'approx_count_distinct'
+    AGGR_APPROX_PERCENTILE = 'approx_percentile'
+    APPROX_PERCENTS = (50, 95, 99)
+    APPROX_PERCENTILE_COMPRESSION = 100
 
     def __init__(self, objects_class, max_limit=None):
         """
@@ -212,6 +318,32 @@ class BaseCollectionResource(BaseResource):
             totals.append({'count': None})
         return totals
 
+    def get_param_sample(self, req, pop_params=True):
+        """
+        Gets the sample and sample_seed params.
+
+        :param req: Falcon request
+        :type req: falcon.request.Request
+
+        :param pop_params: if True, will pop from req params
+        :type pop_params: bool
+
+        :return: a tuple of percentage of rows to sample, None if sampling is disabled, and an optional seed
+        :rtype: tuple
+        """
+        sample = self.get_param_or_post(req, self.PARAM_SAMPLE, pop_params=pop_params)
+        seed = self.get_param_or_post(req, self.PARAM_SAMPLE_SEED, pop_params=pop_params)
+        if sample is None or sample == '':
+            return None, None
+        try:
+            sample = float(sample)
+            seed = int(seed) if seed is not None and seed != '' else None
+        except (TypeError, ValueError):
+            raise falcon.HTTPBadRequest('Invalid attribute', 'Sample and sample seed params require numeric values')
+        if not 0 < sample <= 100:
+            raise falcon.HTTPBadRequest('Invalid attribute', 'Sample must be a percentage greater than 0')
+        return sample, seed
+
     def get_queryset(self, req, resp):
         """
         Return a query object used to fetch data.
@@ -512,3 +644,110 @@ class BaseSingleResource(BaseResource):
         :type resp: falcon.response.Response
         """
         return self.on_put(req, resp, *args, **kwargs)
+
+
+class BaseMultiGetResource(BaseResource):
+    """
+    Base resource class for fetching many records by their ids in a single request.
+    Allows to:
+    * GET - fetch records with ids from the `ids` param, separated by commas
+    * POST - same as GET, with a list of ids in the `ids` key of the request body
+
+    Results are returned in the requested order, with null for every id that wasn't found.
+    """
+    PARAM_IDS = 'ids'
+    # max number of ids in a single request, None disables the limit
+    MAX_IDS = 1000
+
+    def clean_id(self, value):
+        """
+        Converts a requested id to the type of ids of fetched objects.
+
+        :param value: id from the request
+        :type value: str | int
+
+        :return: converted id
+        """
+        return str(value)
+
+    def get_param_ids(self, req):
+        """
+        Gets ids from the `ids` param or request body.
+
+        :param req: Falcon request
+        :type req: falcon.request.Request
+
+        :return: cleaned ids, in the requested order
+        :rtype: list
+        """
+        ids = self.get_param_or_post(req, self.PARAM_IDS, [])
+        if isinstance(ids, str):
+            ids = [value for value in ids.split(',') if value != '']
+        elif not isinstance(ids, list):
+            raise falcon.HTTPBadRequest('Invalid attribute', 'Value of {} attribute must be a list'.format(
+                self.PARAM_IDS))
+        if self.MAX_IDS is not None and len(ids) > self.MAX_IDS:
+            raise falcon.HTTPBadRequest('Invalid attribute', 'Value of {} attribute can\'t have more than {} '
+                                                             'items'.format(self.PARAM_IDS, self.MAX_IDS))
+        try:
+            return [self.clean_id(value) for value in ids]
+        except (TypeError, ValueError):
+            raise falcon.HTTPBadRequest('Invalid attribute', 'Value of {} attribute contains invalid ids'.format(
+                self.PARAM_IDS))
+
+    def get_objects(self, req, resp, ids):
+        """
+        Fetches objects with specified ids.
+
+        :param req: Falcon request
+        :type req: falcon.request.Request
+
+        :param resp: Falcon response
+        :type resp: falcon.response.Response
+
+        :param ids: cleaned ids, without duplicates
+        :type ids: list
+
+        :return: serialized objects that were found, by their id
+        :rtype: dict
+        """
+        raise NotImplementedError
+
+    def get_results(self, req, resp):
+        """
+        :param req: Falcon request
+        :type req: falcon.request.Request
+
+        :param resp: Falcon response
+        :type resp: falcon.response.Response
+
+        :return: serialized objects in the requested order, None for every id that wasn't found
+        :rtype: list
+        """
+        ids = self.get_param_ids(req)
+        objects = self.get_objects(req, resp, list(OrderedDict.fromkeys(ids))) if ids else {}
+        return [objects.get(value) for value in ids]
+
+    def on_get(self, req, resp, *args, **kwargs):
+        """
+        Gets records with specified ids.
+
+        :param req: Falcon request
+        :type req: falcon.request.Request
+
+        :param resp: Falcon response
+        :type resp: falcon.response.Response
+        """
+        self.render_response({'results': self.get_results(req, resp)}, req, resp)
+
+    def on_post(self, req, resp, *args, **kwargs):
+        """
+        Same as :func:`on_get`, allows sending many ids in the request body.
+
+        :param req: Falcon request
+        :type req: falcon.request.Request
+
+        :param resp: Falcon response
+        :type resp: falcon.response.Response
+        """
+        self.render_response({'results': self.get_results(req, resp)}, req, resp)
@@ -1,4 +1,6 @@
-import copy
+import base64
+import threading
+from collections import OrderedDict, namedtuple
 from itertools import chain
 try:
     import ujson as json
@@ -6,16 +8,120 @@ except ImportError:
     import json
 from datetime import datetime, time
 from decimal import Decimal
+from json import JSONDecoder
 
-from elasticsearch import NotFoundError
+from elasticsearch import NotFoundError, ConflictError
+from elasticsearch.client.utils import _make_path
+from elasticsearch.helpers import streaming_bulk
 from elasticsearch_dsl import Search, Nested
-from falcon import HTTPBadRequest, HTTPNotFound, HTTPConflict, HTTP_NO_CONTENT
+from elasticsearch_dsl.aggs import Bucket
+from elasticsearch_dsl.connections import connections
+from elasticsearch_dsl.exceptions import ValidationException
+from falcon import HTTPBadRequest, HTTPNotFound, HTTPConflict, HTTP_NO_CONTENT, HTTP_CREATED, HTTP_BAD_REQUEST, \
+    HTTP_207
 
-from falcon_dbapi.resources.base import BaseCollectionResource, BaseSingleResource
+from falcon_dbapi.resources.base import BaseCollectionResource, BaseSingleResource, BaseMultiGetResource, RawJSON
+
+try:
+    from elasticsearch_dsl.aggs import Composite  # noqa: F401
+except ImportError:
+    class Composite(Bucket):
+        """
+        Composite aggregation, added in elasticsearch-dsl 6.1.
+        """
+        name = 'composite'
+
+
+# filter key resolved using a mapping, see ElasticSearchMixin.resolve_tokens()
+MappingPath = namedtuple('MappingPath', ['column_name', 'nested_name', 'field', 'operator', 'query_class',
+                                         'nested_count', 'error'])
+
+# parts of a compact search response filtered by `hits.total,hits.hits._source,aggregations`, see split_sources()
+SOURCES_FILTER_PATH = 'hits.total,hits.hits._source,aggregations'
+SOURCES_PREFIX = '{"hits":{"total":'
+SOURCES_START = ',"hits":[{"_source":'
+SOURCES_SEPARATOR = '},{"_source":'
+SOURCES_END = '}]}'
+AGGREGATIONS_START = SOURCES_END + ',"aggregations":'
+# number of places where aggregations could start, checked before giving up
+AGGREGATIONS_CANDIDATES = 3
+JSON_DECODER = JSONDecoder()
+
+
+def _decode_remainder(raw):
+    """
+    :param raw: end of a response after the hits object, `}` or `,"aggregations":{...}}`
+    :type raw: str
+
+    :return: decoded keys or None if it's not valid
+    :rtype: dict | None
+    """
+    if raw == '}':
+        return {}
+    if not raw.startswith(','):
+        return None
+    try:
+        return json.loads('{' + raw[1:])
+    except ValueError:
+        return None
+
+
+def split_sources(raw, aggregations=False):
+    """
+    Splits a search response filtered by :py:const:`SOURCES_FILTER_PATH` into `_source` values of hits,
+    kept encoded, and the rest of the response, decoded. ElasticSearch renders responses without whitespace,
+    so hits are separated by `},{"_source":`, and quotes are escaped inside strings. The separator can appear
+    only in documents containing lists of objects with a `_source` key, so callers have to check the number of hits.
+
+    :param raw: encoded response
+    :type raw: str
+
+    :param aggregations: if the search contains aggregations, rendered after hits
+    :type aggregations: bool
+
+    :return: encoded sources and the response without hits, or None if the response has a different layout
+    :rtype: tuple | None
+    """
+    if not raw.startswith(SOURCES_PREFIX):
+        return None
+    try:
+        total, idx = JSON_DECODER.raw_decode(raw, len(SOURCES_PREFIX))
+    except ValueError:
+        return None
+    if not raw.startswith(SOURCES_START, idx):
+        # no hits or hits without a source
+        response = _decode_remainder(raw[idx + 1:]) if raw.startswith('}', idx) else None
+        if response is None:
+            return None
+        response['hits'] = {'total': total}
+        return [], response
+    start = idx + len(SOURCES_START)
+    candidates = []
+    if aggregations:
+        # aggregations are rendered after hits and usually small, so their start is found from the end,
+        # only the real one leaves a valid remainder
+        end = len(raw)
+        while len(candidates) < AGGREGATIONS_CANDIDATES:
+            end = raw.rfind(AGGREGATIONS_START, start, end)
+            if end == -1:
+                break
+            candidates.append(end)
+    elif raw.endswith(SOURCES_END + '}'):
+        candidates.append(len(raw) - len(SOURCES_END) - 1)
+    for end in candidates:
+        response = _decode_remainder(raw[end + len(SOURCES_END):])
+        if response is not None:
+            response['hits'] = {'total': total}
+            return raw[start:end].split(SOURCES_SEPARATOR), response
+    return None
 
 
 class ElasticSearchMixin(object):
     DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+    # number of resolved filter keys to remember, see resolve_tokens()
+    MAPPING_CACHE_SIZE = 1000
+    # guards the resolved filter keys, shared by resources serving requests in multiple threads
+    _mapping_paths_lock = threading.Lock()
 
     _underscore_operators = {
         'exact':        'term',
@@ -76,6 +182,7 @@ class ElasticSearchMixin(object):
         :return: modified query
         :rtype: elasticsearch.Search
         """
+        self.check_filter_complexity(conditions, self._logical_operators)
         expressions = self._build_filter_expressions(conditions, None)
         if expressions is None:
             return query
@@ -83,6 +190,31 @@ class ElasticSearchMixin(object):
             return query.update_from_dict({'query': {'constant_score': {'filter': expressions}}})
         return query.update_from_dict({'query': expressions})
 
+    def sample_by(self, query, sample, seed=None):
+        """
+        Wraps the query in a random score function and skips documents scored below the sample percentage.
+        Aggregations are calculated only using the sampled documents.
+
+        :param query: Search object
+        :type query: elasticsearch.Search
+
+        :param sample: percentage of documents to select, None to disable sampling
+        :type sample: float | None
+
+        :param seed: makes the sample repeatable
+        :type seed: int | None
+
+        :return: modified query
+        :rtype: elasticsearch.Search
+        """
+        if sample is None or sample >= 100:
+            return query
+        function_score = {'query': query.to_dict().get('query', {'match_all': {}}),
+                          'random_score': {'seed': seed} if seed is not None else {},
+                          'boost_mode': 'replace'}
+        return query.update_from_dict({'query': {'function_score': function_score},
+                                       'min_score': 1 - sample / 100.0})
+
     def _build_filter_expressions(self, conditions, default_op, prevent_expand=True):
         """
         :param conditions: conditions dictionary
@@ -130,7 +262,9 @@ class ElasticSearchMixin(object):
 
     def _group_nested(self, expressions, op):
         """
-        Group all nested queries with common path, so {a__b__c, a__b__d, a__e, f} becomes {a: {b: {c, d}, e}, f}
+        Group all nested queries with common path, so {a__c, b__e, a__d, f} becomes {b__e, f, a: {c, d}}.
+        Groups are appended after other expressions, in order of their first query.
+
         :param expressions: expressions returned by _parse_tokens()
         :type expressions: list[dict]
 
@@ -140,27 +274,16 @@ class ElasticSearchMixin(object):
         :return: modified expressions
         :rtype: list[dict]
         """
-        expressions = copy.deepcopy(expressions)
-        while True:
-            longest_path = None
-            for part in expressions:
-                if list(part.keys()) == ['nested']:
-                    if longest_path is None or part['nested']['path'].count('.') > longest_path.count('.'):
-                        longest_path = part['nested']['path']
-            if longest_path is None:
-                break
-            new_parts = []
-            group = []
-            for part in expressions:
-                if list(part.keys()) == ['nested'] and part['nested']['path'] == longest_path:
-                    group.append(part['nested']['query'])
-                else:
-                    new_parts.append(part)
-            if len(group) <= 1:
-                break
-            expressions = new_parts
-            expressions.append({'nested': {'path': longest_path, 'query': {'bool': {op: group}}}})
-        return expressions
+        groups = OrderedDict()
+        for part in expressions:
+            if len(part) == 1 and 'nested' in part:
+                groups.setdefault(part['nested']['path'], []).append(part['nested']['query'])
+        result = [part for part in expressions
+                  if len(part) != 1 or 'nested' not in part or len(groups[part['nested']['path']]) == 1]
+        for path, group in groups.items():
+            if len(group) > 1:
+                result.append({'nested': {'path': path, 'query': {'bool': {op: group}}}})
+        return result
 
     def _parse_logical_op(self, arg, value, op, prevent_expand=True):
         if isinstance(value, dict):
@@ -222,31 +345,69 @@ class ElasticSearchMixin(object):
         except IndexError:
             return False
 
-    def _parse_tokens(self, obj_class, tokens, value, default_expression=None, prevent_expand=True, prefer_raw=False):
+    def resolve_tokens(self, obj_class, tokens, prefer_raw=False):
+        """
+        Resolves tokens of a filter key to a column name, nested path, field and operator using the mapping.
+        Results don't depend on filter values, so they're cached until the mapping is replaced
+        or :func:`clear_mapping_cache` is called after modifying it.
+
+        :param obj_class: DocType class
+        :type obj_class: type
+
+        :param tokens: filter key split by `__`
+        :type tokens: list[str]
+
+        :param prefer_raw: use the `raw` not analyzed subfield, if available
+        :type prefer_raw: bool
+
+        :rtype: MappingPath
+        """
+        mapping = obj_class._doc_type.mapping
+        key = (obj_class, tuple(tokens), prefer_raw)
+        with self._mapping_paths_lock:
+            if getattr(self, '_mapping_paths', None) is None:
+                self._mapping_paths = OrderedDict()
+            cached = self._mapping_paths.get(key)
+            if cached is not None and cached[0] is mapping:
+                self._mapping_paths.move_to_end(key)
+                return cached[1]
+        path = self._resolve_tokens(obj_class, tokens, prefer_raw)
+        with self._mapping_paths_lock:
+            self._mapping_paths[key] = (mapping, path)
+            if len(self._mapping_paths) > self.MAPPING_CACHE_SIZE:
+                self._mapping_paths.popitem(last=False)
+        return path
+
+    def clear_mapping_cache(self):
+        """
+        Forgets filter keys resolved by :func:`resolve_tokens`, call it after modifying a mapping in place.
+        """
+        with self._mapping_paths_lock:
+            self._mapping_paths = OrderedDict()
+
+    def _resolve_tokens(self, obj_class, tokens, prefer_raw=False):
         column_name = None
         field = None
         sub_fields = {}
         nested_name = None
+        nested_count = 0
         accumulated = ''
         mapping = obj_class._doc_type.mapping
         for index, token in enumerate(tokens):
             if token == CollectionResource.PARAM_TEXT_QUERY:
-                query_method = getattr(obj_class, 'get_term_query', None)
-                if not callable(query_method):
-                    raise HTTPBadRequest('Invalid attribute', 'Param {} is invalid, specific object '
-                                                              'can\'t provide a query'.format('__'.join(tokens)))
-                return query_method(self=obj_class, column_name=column_name, value=value,
-                                    default_op='should' if tokens[-1] == 'or' else 'must')
+                return MappingPath(column_name, nested_name, field, None, obj_class, nested_count, None)
 
             if column_name is not None:
                 if token not in chain(self._underscore_operators, sub_fields):
-                    raise HTTPBadRequest('Invalid attribute', 'Param {} is invalid, part {} is expected to be a known '
-                                                              'operator or a subfield'.format('__'.join(tokens), token))
+                    return MappingPath(column_name, nested_name, field, None, None, nested_count,
+                                       'Param {} is invalid, part {} is expected to be a known '
+                                       'operator or a subfield'.format('__'.join(tokens), token))
                 if token in self._underscore_operators:
-                    return self._build_expression(value, token, column_name, field, nested_name, prevent_expand)
+                    return MappingPath(column_name, nested_name, field, token, None, nested_count, None)
 
             if accumulated and accumulated in mapping and isinstance(mapping[accumulated], Nested):
                 # check if previously accumulated tokens match an existing nested field and switch mappings to it
+                nested_count += 1
                 nested_name = accumulated
                 obj_class = mapping[accumulated]._doc_class
                 mapping = mapping[accumulated]
@@ -265,13 +426,34 @@ class ElasticSearchMixin(object):
                 column_name = '{}.{}'.format(column_name, token)
 
         if column_name is None:
-            raise HTTPBadRequest('Invalid attribute', 'Param {} is invalid, it is expected to be a known '
-                                                      'column name'.format('__'.join(tokens)))
-        if column_name is not None and default_expression is not None:
+            return MappingPath(None, nested_name, None, None, None, nested_count,
+                               'Param {} is invalid, it is expected to be a known '
+                               'column name'.format('__'.join(tokens)))
+        return MappingPath(column_name, nested_name, field, None, None, nested_count, None)
+
+    def _parse_tokens(self, obj_class, tokens, value, default_expression=None, prevent_expand=True, prefer_raw=False):
+        path = self.resolve_tokens(obj_class, tokens, prefer_raw)
+        if self.MAX_FILTER_JOINS is not None and path.nested_count > self.MAX_FILTER_JOINS:
+            raise HTTPBadRequest('Invalid attribute', 'Param {} is invalid, can\'t use more than {} '
+                                                      'nested fields'.format('__'.join(tokens),
+                                                                             self.MAX_FILTER_JOINS))
+        if path.query_class is not None:
+            query_method = getattr(path.query_class, 'get_term_query', None)
+            if not callable(query_method):
+                raise HTTPBadRequest('Invalid attribute', 'Param {} is invalid, specific object '
+                                                          'can\'t provide a query'.format('__'.join(tokens)))
+            return query_method(self=path.query_class, column_name=path.column_name, value=value,
+                                default_op='should' if tokens[-1] == 'or' else 'must')
+        if path.error is not None:
+            raise HTTPBadRequest('Invalid attribute', path.error)
+        if path.operator is not None:
+            return self._build_expression(value, path.operator, path.column_name, path.field, path.nested_name,
+                                          prevent_expand)
+        if default_expression is not None:
             # if last token was a relation it's just going to be ignored
-            expression = default_expression(column_name, value)
-            if nested_name is not None:
-                return {'nested': {'path': nested_name, 'query': expression}}
+            expression = default_expression(path.column_name, value)
+            if path.nested_name is not None:
+                return {'nested': {'path': path.nested_name, 'query': expression}}
             return expression
         return None
 
@@ -301,10 +483,45 @@ class CollectionResource(ElasticSearchMixin, BaseCollectionResource):
     When fetching a collection (GET), following params are supported:
 
     * limit, offset - for pagination
+    * cursor - for deep pagination, `_start` to get the first page, then `next_cursor` from the previous response
+    * scroll - keep alive time of a scroll context used with a cursor, like `1m`, for long exports
     * total_count - to calculate total number of items matching filters, without pagination
+    * groups_after - next page of group_by totals, `groups_after` from the previous response,
+      when :py:const:`COMPOSITE_GROUP_BY` is enabled
     * all other params are treated as filters, syntax mimics Django filters,
       see :py:const:`ElasticSearchMixin._underscore_operators`
+
+    When creating (POST), a list of documents is indexed using the bulk API, `_id` keys are used as document ids
+    and the `refresh` param can be set to `false`, `wait_for` (ElasticSearch 5.0 and newer) or `true`.
     """
+    CARDINALITY_PRECISION_THRESHOLD = 3000
+    # maximum number of documents and bytes sent in a single bulk request
+    BULK_CHUNK_SIZE = 500
+    BULK_CHUNK_BYTES = 10 * 1024 * 1024
+    PARAM_REFRESH = 'refresh'
+    # `wait_for` requires ElasticSearch 5.0+, remove it from policies when using older versions
+    REFRESH_POLICIES = ('false', 'wait_for', 'true')
+    # set to True on ElasticSearch 7+ to count all hits exactly instead of up to 10000, not supported before 7
+    TRACK_TOTAL_HITS = None
+    # cache results of searches returning only totals on shards, None to use the index setting
+    REQUEST_CACHE = True
+    # pass _source of documents to the response without decoding them, requires the JSONTranslator middleware
+    RAW_SOURCE = False
+    # search preference, see get_preference()
+    PREFERENCE = None
+
+    # page group_by totals using composite aggregations, requires ElasticSearch 6.1 or newer
+    COMPOSITE_GROUP_BY = False
+    # number of groups in a page of composite aggregations, if group_limit is not set
+    GROUP_PAGE_SIZE = 1000
+
+    PARAM_GROUPS_AFTER = 'groups_after'
+    PARAM_CURSOR = 'cursor'
+    PARAM_SCROLL = 'scroll'
+    CURSOR_START = '_start'
+    # orders documents with equal sort values when paginating using search_after,
+    # on ElasticSearch 6 and newer set it to a unique field like `id`
+    CURSOR_TIEBREAKER = '_uid'
 
     def __init__(self, objects_class, connection, max_limit=None):
         """
@@ -317,15 +534,102 @@ class CollectionResource(ElasticSearchMixin, BaseCollectionResource):
         self.connection = connection
 
     def get_base_query(self, req, resp):
-        return Search(using=self.connection,
-                      index=self.objects_class._doc_type.index,
-                      doc_type=self.objects_class)
+        query = Search(using=self.connection,
+                       index=self.objects_class._doc_type.index,
+                       doc_type=self.objects_class)
+        preference = self.get_preference(req)
+        if preference is not None:
+            query = query.params(preference=preference)
+        return query
+
+    def get_preference(self, req):
+        """
+        Override to route requests, for example of a single user, to the same shard copies,
+        so they use the same caches and return consistent results.
+
+        :param req: Falcon request
+        :type req: falcon.request.Request
+
+        :return: search preference, like a custom string or `_local`, defaults to :py:const:`PREFERENCE`
+        :rtype: str | None
+        """
+        return self.PREFERENCE
 
     def get_special_params(self):
-        return [self.PARAM_LIMIT, self.PARAM_OFFSET, self.PARAM_TOTAL_COUNT, self.PARAM_TOTALS, self.PARAM_TEXT_QUERY]
+        return [self.PARAM_LIMIT, self.PARAM_OFFSET, self.PARAM_TOTAL_COUNT, self.PARAM_TOTALS, self.PARAM_TEXT_QUERY,
+                self.PARAM_SAMPLE, self.PARAM_SAMPLE_SEED, self.PARAM_CURSOR, self.PARAM_SCROLL,
+                self.PARAM_GROUPS_AFTER]
+
+    def get_param_cursor(self, req):
+        """
+        Gets and decodes the cursor param.
+
+        :param req: Falcon request
+        :type req: falcon.request.Request
+
+        :return: cursor state, an empty dict to get the first page or None if cursor pagination is not used
+        :rtype: dict | None
+        """
+        cursor = self.get_param_or_post(req, self.PARAM_CURSOR)
+        if cursor is None:
+            return None
+        if cursor == self.CURSOR_START:
+            return {}
+        cursor = self.decode_cursor(cursor, self.PARAM_CURSOR)
+        if 'after' not in cursor and 'scroll_id' not in cursor:
+            raise HTTPBadRequest('Invalid attribute',
+                                 'Value of {} attribute is invalid'.format(self.PARAM_CURSOR))
+        return cursor
+
+    def get_param_groups_after(self, req):
+        """
+        Gets and decodes the groups_after param.
+
+        :param req: Falcon request
+        :type req: falcon.request.Request
+
+        :return: key of the last group of the previous page or None
+        :rtype: dict | None
+        """
+        groups_after = self.get_param_or_post(req, self.PARAM_GROUPS_AFTER)
+        if groups_after is None:
+            return None
+        return self.decode_cursor(groups_after, self.PARAM_GROUPS_AFTER)
+
+    @staticmethod
+    def decode_cursor(cursor, name):
+        """
+        :param cursor: opaque cursor returned by :func:`encode_cursor`
+        :type cursor: str
+
+        :param name: param name, used in the error message
+        :type name: str
+
+        :return: cursor state
+        :rtype: dict
+        """
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        except (ValueError, TypeError, AttributeError, UnicodeError):
+            cursor = None
+        if not isinstance(cursor, dict):
+            raise HTTPBadRequest('Invalid attribute', 'Value of {} attribute is invalid'.format(name))
+        return cursor
+
+    @staticmethod
+    def encode_cursor(cursor):
+        """
+        :param cursor: cursor state
+        :type cursor: dict
+
+        :return: opaque cursor returned to clients
+        :rtype: str
+        """
+        return base64.urlsafe_b64encode(json.dumps(cursor).encode('utf-8')).decode('ascii')
 
     def get_queryset(self, req, resp):
         query = self.get_base_query(req, resp)
+        sample, seed = self.get_param_sample(req)
         conditions = {}
         if 'doc' in req.context:
             conditions = dict(req.context['doc'])
@@ -343,7 +647,7 @@ class CollectionResource(ElasticSearchMixin, BaseCollectionResource):
 
         order = conditions.pop(self.PARAM_ORDER, None)
         if not order:
-            return self.filter_by(query, conditions)
+            return self.sample_by(self.filter_by(query, conditions), sample, seed)
 
         if isinstance(order, str):
             if (order[0] == '{' and order[-1] == '}') or (order[0] == '[' and order[-1] == ']'):
@@ -357,7 +661,7 @@ class CollectionResource(ElasticSearchMixin, BaseCollectionResource):
         order_expressions = self._build_order_expressions(order)
         if order_expressions:
             query = query.sort(*order_expressions)
-        return self.filter_by(query, conditions, order_criteria=order_expressions)
+        return self.sample_by(self.filter_by(query, conditions, order_criteria=order_expressions), sample, seed)
 
     @classmethod
     def flatten_aggregate(cls, key, value):
@@ -368,7 +672,9 @@ class CollectionResource(ElasticSearchMixin, BaseCollectionResource):
                         continue
                     return cls.flatten_aggregate(subkey, subvalue)
                 raise Exception('Empty nested or filtered aggregate')
-            return key, value['value'] if 'value' in value else value
+            return key, cls._aggregate_value(value)
+        if value['buckets'] and isinstance(value['buckets'][0]['key'], dict):
+            return cls._flatten_composite(value)
         values = {}
         values_key = None
         result_key = None
@@ -393,32 +699,116 @@ class CollectionResource(ElasticSearchMixin, BaseCollectionResource):
                         agg_name, values[str(bucket[result_key])] = cls.flatten_aggregate(subkey, subvalue)
             else:
                 values[str(bucket[result_key])] = bucket['doc_count'] if values_key is None else \
-                    bucket[values_key]['value']
+                    cls._aggregate_value(bucket[values_key])
+        return (agg_name or 'count'), values
+
+    @classmethod
+    def _flatten_composite(cls, value):
+        """
+        Flattens buckets of a composite aggregation like terms buckets, nesting values by every source.
+        """
+        values = {}
+        agg_name = None
+        for bucket in value['buckets']:
+            sources = list(bucket['key'].values())
+            agg_name, bucket_values = cls.flatten_aggregate('composite', {'buckets': [dict(bucket, key=sources[-1])]})
+            target = values
+            for source in sources[:-1]:
+                target = target.setdefault(str(source), {})
+            target.update(bucket_values)
         return (agg_name or 'count'), values
 
+    @staticmethod
+    def _aggregate_value(value):
+        """
+        Extracts the value from a single or multi value metric aggregate, like `percentiles`.
+        """
+        if 'value' in value:
+            return value['value']
+        if 'values' in value:
+            return value['values']
+        return value
+
     def get_total_objects(self, queryset, totals):
         if not totals:
             return {}
-        queryset = self._build_total_expressions(queryset, totals)
-        aggs = queryset.execute()._d_.get('aggregations', {})
+        queryset = self.get_totals_only_queryset(self.track_total_hits(self._build_total_expressions(queryset, totals)))
+        return self.get_response_totals(queryset.execute()._d_)
+
+    def get_totals_only_queryset(self, queryset):
+        """
+        Modifies a search so it returns only aggregations, without hits, and can be answered from the shard
+        request cache: documents are matched in the filter context, without calculating scores, unless
+        they're sampled, and results are not sorted.
+
+        :param queryset: Search object
+        :type queryset: elasticsearch.Search
+
+        :return: modified query
+        :rtype: elasticsearch.Search
+        """
+        body = queryset.to_dict()
+        body['size'] = 0
+        body.pop('from', None)
+        body.pop('sort', None)
+        query = body.get('query')
+        # sampling uses random scores
+        if query and 'min_score' not in body and 'constant_score' not in query and 'match_all' not in query:
+            body['query'] = {'constant_score': {'filter': query}}
+        queryset = queryset.sort().update_from_dict(body)
+        if self.REQUEST_CACHE is not None:
+            queryset = queryset.params(request_cache=self.REQUEST_CACHE)
+        return queryset
+
+    def track_total_hits(self, queryset):
+        """
+        Enables exact total hits counting, if configured in `TRACK_TOTAL_HITS`.
+
+        :param queryset: Search object
+        :type queryset: elasticsearch.Search
+
+        :return: modified query
+        :rtype: elasticsearch.Search
+        """
+        if self.TRACK_TOTAL_HITS is None:
+            return queryset
+        return queryset.extra(track_total_hits=self.TRACK_TOTAL_HITS)
+
+    def get_response_totals(self, response):
+        """
+        :param response: raw search response, containing aggregations built by :func:`_build_total_expressions`
+        :type response: dict
+
+        :return: totals, including `total_count` taken from the hits total if not aggregated
+                 and `groups_after` if group_by totals were paged
+        :rtype: dict
+        """
         result = {}
-        for key, value in aggs.items():
+        for key, value in response.get('aggregations', {}).items():
             result_key, result_value = self.flatten_aggregate(key, value)
             result['total_' + result_key] = result_value
+            if value.get('buckets') and isinstance(value['buckets'][0]['key'], dict):
+                # after_key is returned since ElasticSearch 6.3
+                result[self.PARAM_GROUPS_AFTER] = self.encode_cursor(value.get('after_key',
+                                                                               value['buckets'][-1]['key']))
         if 'total_count' not in result:
-            result['total_count'] = queryset.execute()._d_['hits']['total']
+            total = response['hits']['total']
+            # since ElasticSearch 7 the total is an object with the value and its relation
+            result['total_count'] = total['value'] if isinstance(total, dict) else total
         return result
 
     def _nest_aggregates(self, aggregates, group_by):
         for name, expression in group_by[::-1]:
             if aggregates:
                 if 'terms' in expression:
-                    expression['terms']['order'] = dict.fromkeys(aggregates.keys(), 'desc')
+                    # multi value metrics can't be used for ordering
+                    expression['terms']['order'] = {name: 'desc' for name, aggregate in aggregates.items()
+                                                    if 'percentiles' not in aggregate}
                 expression['aggs'] = aggregates
             aggregates = {name: expression}
         return aggregates
 
-    def _build_total_expressions(self, queryset, totals):
+    def _build_total_expressions(self, queryset, totals, groups_after=None):
         aggregates = {}
         nested_groups = {}
         nested_aggs = {}
@@ -467,8 +857,12 @@ class CollectionResource(ElasticSearchMixin, BaseCollectionResource):
             for aggregate, columns in total.items():
                 if aggregate == 'count' or aggregate == self.AGGR_GROUPLIMIT or aggregate == self.AGGR_GROUPBY:
                     continue
+                if aggregate == self.AGGR_ROLLUP:
+                    if columns:
+                        raise HTTPBadRequest('Invalid attribute', 'Rollup option is not supported')
+                    continue
                 if not columns:
-                    aggregates[aggregate] = {aggregate: {'field': 'id'}}
+                    aggregates[aggregate] = self._build_aggregate(aggregate, 'id')
                     continue
                 if not isinstance(columns, list):
                     columns = [columns]
@@ -485,48 +879,252 @@ class CollectionResource(ElasticSearchMixin, BaseCollectionResource):
                             nested_aggs[expression['nested']['path']] = \
                                 ('nested', {'nested': {'path': expression['nested']['path']}})
                         expression = expression['nested']['query']
-                    aggregates[aggregate] = {aggregate: {'field': expression}}
+                    aggregates[aggregate] = self._build_aggregate(aggregate, expression)
                     if nested_aggs:
                         aggregates = self._nest_aggregates(aggregates, list(nested_aggs.values()))
                         nested_aggs = {}
-        aggregates = self._nest_aggregates(aggregates, group_by)
+        if self.COMPOSITE_GROUP_BY and group_by and all('terms' in expression for _, expression in group_by):
+            # composite aggregations can't be nested, so groups on nested or filtered fields still use terms
+            composite = {'size': group_limit or self.GROUP_PAGE_SIZE,
+                         'sources': [{name: {'terms': {'field': expression['terms']['field']}}}
+                                     for name, expression in group_by]}
+            if groups_after:
+                composite['after'] = groups_after
+            expression = {'composite': composite}
+            if aggregates:
+                expression['aggs'] = aggregates
+            aggregates = {self.AGGR_GROUPBY: expression}
+        else:
+            aggregates = self._nest_aggregates(aggregates, group_by)
         if aggregates:
-            return queryset.update_from_dict({'aggs': aggregates})
+            # update_from_dict() replaces all extra keys, like from, size or min_score, so pass them again
+            body = queryset.to_dict()
+            body['aggs'] = aggregates
+            return queryset.extra().update_from_dict(body)
         return queryset
 
-    def get_data(self, req, resp):
+    def _build_aggregate(self, aggregate, field):
+        """
+        :param aggregate: aggregate function name, approximate aggregates are mapped to ElasticSearch names
+        :type aggregate: str
+
+        :param field: field name
+        :type field: str
+
+        :return: aggregate expression
+        :rtype: dict
+        """
+        if aggregate == self.AGGR_APPROX_COUNT_DISTINCT:
+            return {'cardinality': {'field': field,
+                                    'precision_threshold': self.CARDINALITY_PRECISION_THRESHOLD}}
+        if aggregate == self.AGGR_APPROX_PERCENTILE:
+            return {'percentiles': {'field': field,
+                                    'percents': list(self.APPROX_PERCENTS),
+                                    'compression': self.APPROX_PERCENTILE_COMPRESSION}}
+        return {aggregate: {'field': field}}
+
+    def get_page_queryset(self, req, resp):
+        """
+        Builds a single search request fetching a page of results, aggregations and the hits total.
+
+        :param req: Falcon request
+        :type req: falcon.request.Request
+
+        :param resp: Falcon response
+        :type resp: falcon.response.Response
+
+        :return: the search, the limit and requested totals
+        :rtype: tuple
+        """
         limit = self.get_param_or_post(req, self.PARAM_LIMIT, self.max_limit)
         if limit is not None:
             limit = int(limit)
         offset = self.get_param_or_post(req, self.PARAM_OFFSET, 0)
         totals = self.get_param_totals(req)
+        groups_after = self.get_param_groups_after(req)
 
         queryset = self.get_queryset(req, resp)
-        data = self.get_object_list(queryset, limit, int(offset))
-        object_list = None
-        if limit != 0:
-            object_list = [item['_source'] for item in data.execute()._d_['hits']['hits']] if data else []
-        # get totals after objects to reuse main query
-        totals = self.get_total_objects(queryset, totals)
+        if totals:
+            queryset = self.track_total_hits(self._build_total_expressions(queryset, totals, groups_after))
+        if limit == 0:
+            queryset = self.get_totals_only_queryset(queryset)
+        else:
+            queryset = self.get_object_list(queryset, limit, int(offset))
+        return queryset, limit, totals
+
+    def get_data(self, req, resp):
+        queryset, limit, totals = self.get_page_queryset(req, resp)
+        if limit == 0 and not totals:
+            return None, {}
+        response = queryset.execute()._d_
+        object_list = None if limit == 0 else [item['_source'] for item in response['hits']['hits']]
+        return object_list, self.get_response_totals(response) if totals else {}
+
+    def execute_raw(self, queryset, **params):
+        """
+        Sends the search using the low-level client, without decoding the response.
+        Requests aren't retried on other nodes.
+
+        :param queryset: Search object
+        :type queryset: elasticsearch.Search
 
-        return object_list, totals
+        :param params: additional query params, like `filter_path`
+
+        :return: encoded response
+        :rtype: str
+        """
+        es = connections.get_connection(self.connection)
+        params = dict(queryset._params, **params)
+        path = _make_path(','.join(queryset._index or []), ','.join(queryset._doc_type), '_search')
+        _, _, raw = es.transport.get_connection().perform_request('POST', path, params=params,
+                                                                  body=es.transport.serializer.dumps(
+                                                                      queryset.to_dict()).encode('utf-8'))
+        return raw
+
+    @staticmethod
+    def get_expected_hits(body, total):
+        """
+        :param body: search request body
+        :type body: dict
+
+        :param total: hits total from the response
+        :type total: int | dict
+
+        :return: number of hits the search returns or None if the total is only a lower bound below the page end
+        :rtype: int | None
+        """
+        size = body.get('size', 10)
+        offset = body.get('from', 0)
+        if isinstance(total, dict):
+            if total.get('relation', 'eq') != 'eq' and total['value'] < offset + size:
+                return None
+            total = total['value']
+        return max(min(size, total - offset), 0)
+
+    def get_raw_data(self, req, resp):
+        """
+        Same as :func:`get_data`, but `_source` of hits is copied from the response without decoding it,
+        if :func:`split_sources` found as many hits as expected from the total. Otherwise, for example
+        when some hits don't have a `_source`, the whole response is decoded and sources are encoded again.
+
+        :param req: Falcon request
+        :type req: falcon.request.Request
+
+        :param resp: Falcon response
+        :type resp: falcon.response.Response
+
+        :return: encoded objects, or None if not requested, and totals
+        :rtype: tuple
+        """
+        queryset, limit, totals = self.get_page_queryset(req, resp)
+        if limit == 0 and not totals:
+            return None, {}
+        body = queryset.to_dict()
+        raw = self.execute_raw(queryset, filter_path=SOURCES_FILTER_PATH)
+        split = split_sources(raw, aggregations='aggs' in body)
+        if split is not None and len(split[0]) == self.get_expected_hits(body, split[1]['hits']['total']):
+            object_list, response = split
+        else:
+            response = json.loads(raw)
+            object_list = [json.dumps(item.get('_source')) for item in response.get('hits', {}).get('hits', [])]
+        return None if limit == 0 else object_list, self.get_response_totals(response) if totals else {}
+
+    def get_cursor_data(self, req, resp, cursor):
+        """
+        Fetches a page of results after a cursor, using `search_after` with the requested order
+        and :py:const:`CURSOR_TIEBREAKER`, or a scroll context if the `scroll` param is set.
+        Unlike `offset`, it's not limited by `index.max_result_window` and doesn't get slower on deeper pages.
+
+        :param req: Falcon request
+        :type req: falcon.request.Request
+
+        :param resp: Falcon response
+        :type resp: falcon.response.Response
+
+        :param cursor: cursor state from :func:`get_param_cursor`
+        :type cursor: dict
+
+        :return: objects, totals and a cursor of the next page, None if there are no more results
+        :rtype: tuple
+        """
+        limit = self.get_param_or_post(req, self.PARAM_LIMIT, self.max_limit)
+        if limit is not None:
+            limit = int(limit)
+        scroll = self.get_param_or_post(req, self.PARAM_SCROLL)
+        totals = self.get_param_totals(req)
+        groups_after = self.get_param_groups_after(req)
+
+        if 'scroll_id' in cursor:
+            scroll, size = cursor['scroll'], cursor['size']
+            response = connections.get_connection(self.connection).scroll(scroll_id=cursor['scroll_id'],
+                                                                          scroll=scroll)
+        else:
+            queryset = self.get_queryset(req, resp)
+            if totals:
+                queryset = self.track_total_hits(self._build_total_expressions(queryset, totals, groups_after))
+            sort = queryset.to_dict().get('sort', [])
+            if scroll:
+                queryset = queryset.params(scroll=scroll)
+                if not sort:
+                    queryset = queryset.sort('_doc')
+            else:
+                if self.CURSOR_TIEBREAKER not in sort:
+                    queryset = queryset.sort(*(sort + [self.CURSOR_TIEBREAKER]))
+                if 'after' in cursor:
+                    queryset = queryset.extra(search_after=cursor['after'])
+            queryset = self.get_object_list(queryset, limit, 0)
+            size = queryset.to_dict()['size']
+            response = queryset.execute()._d_
+
+        hits = response['hits']['hits']
+        next_cursor = None
+        if hits and len(hits) >= size:
+            if scroll:
+                next_cursor = self.encode_cursor({'scroll_id': response['_scroll_id'], 'scroll': scroll, 'size': size})
+            else:
+                next_cursor = self.encode_cursor({'after': hits[-1]['sort']})
+        elif scroll:
+            connections.get_connection(self.connection).clear_scroll(scroll_id=response['_scroll_id'])
+        object_list = [item['_source'] for item in hits]
+        return object_list, self.get_response_totals(response) if totals else {}, next_cursor
 
     def on_get(self, req, resp):
-        object_list, totals = self.get_data(req, resp)
+        sample, _ = self.get_param_sample(req, pop_params=False)
+        cursor = self.get_param_cursor(req)
+        next_cursor = None
+        raw = cursor is None and self.RAW_SOURCE
+        if raw:
+            object_list, totals = self.get_raw_data(req, resp)
+        elif cursor is None:
+            object_list, totals = self.get_data(req, resp)
+        else:
+            object_list, totals, next_cursor = self.get_cursor_data(req, resp, cursor)
 
         # use raw data from object_list and avoid unnecessary serialization
         total_count = totals.pop('total_count', None)
         result = {'results': object_list or [],
                   'total': total_count,
                   'returned': len(object_list or [])}
+        if sample is not None:
+            result[self.PARAM_SAMPLE] = sample
+        if cursor is not None:
+            result['next_cursor'] = next_cursor
         result.update(totals)
         headers = {'x-api-total': str(total_count) if isinstance(total_count, int) else '',
                    'x-api-returned': str(result['returned'])}
         resp.set_headers(headers)
+        if raw:
+            # sources are already encoded
+            encoded = '[' + ','.join(result.pop('results')) + ']'
+            result = RawJSON.from_parts(result, {'results': encoded})
         self.render_response(result, req, resp)
 
     def on_head(self, req, resp):
-        object_list, totals = self.get_data(req, resp)
+        cursor = self.get_param_cursor(req)
+        if cursor is None:
+            object_list, totals = self.get_data(req, resp)
+        else:
+            object_list, totals, _ = self.get_cursor_data(req, resp, cursor)
 
         # use raw data from object_list and avoid unnecessary serialization
         total_count = totals.pop('total_count', None)
@@ -535,17 +1133,142 @@ class CollectionResource(ElasticSearchMixin, BaseCollectionResource):
         resp.set_headers(headers)
         resp.status = HTTP_NO_CONTENT
 
+    def get_param_refresh(self, req):
+        """
+        Gets the refresh policy from query params, because the body contains documents.
+
+        :param req: Falcon request
+        :type req: falcon.request.Request
+
+        :return: one of :py:const:`REFRESH_POLICIES` or None to use the default
+        :rtype: str | None
+        """
+        refresh = req.params.pop(self.PARAM_REFRESH, None)
+        if refresh is None:
+            return None
+        if refresh not in self.REFRESH_POLICIES:
+            raise HTTPBadRequest('Invalid attribute', 'Value of {} attribute must be one of: {}'.format(
+                self.PARAM_REFRESH, ', '.join(self.REFRESH_POLICIES)))
+        return refresh
+
     def create(self, req, resp, data):
-        resource = self.objects_class(**data)
-        resource.save(using=self.connection)
+        refresh = self.get_param_refresh(req)
+        doc_id = data.pop('_id', None)
+        resource = self.objects_class(meta={'id': str(doc_id)} if doc_id is not None else None, **data)
+        resource.save(using=self.connection, **({'refresh': refresh} if refresh is not None else {}))
         return self.serialize(resource)
 
+    def create_bulk(self, req, resp, documents):
+        """
+        Indexes documents using the bulk API, in chunks limited by :py:const:`BULK_CHUNK_SIZE`
+        and :py:const:`BULK_CHUNK_BYTES`.
+
+        :param req: Falcon request
+        :type req: falcon.request.Request
+
+        :param resp: Falcon response
+        :type resp: falcon.response.Response
+
+        :param documents: tuples of a document id, None to generate it, and data
+        :type documents: list[tuple]
+
+        :return: result of every document, its `id` and `status` or an `error`
+        :rtype: list[dict]
+        """
+        refresh = self.get_param_refresh(req)
+        results = [None] * len(documents)
+        indexes = []
+        actions = []
+        for index, (doc_id, data) in enumerate(documents):
+            resource = self.objects_class(**data)
+            try:
+                resource.full_clean()
+            except ValidationException as e:
+                results[index] = {'status': 400, 'error': str(e)}
+                continue
+            action = {'_index': self.objects_class._doc_type.index,
+                      '_type': self.objects_class._doc_type.name,
+                      '_source': resource.to_dict()}
+            if doc_id is not None:
+                action['_id'] = str(doc_id)
+            indexes.append(index)
+            actions.append(action)
+        if not actions:
+            return results
+        kwargs = {'refresh': refresh} if refresh is not None else {}
+        items = streaming_bulk(connections.get_connection(self.connection), actions,
+                               chunk_size=self.BULK_CHUNK_SIZE, max_chunk_bytes=self.BULK_CHUNK_BYTES,
+                               raise_on_error=False, raise_on_exception=False, **kwargs)
+        for index, (ok, item) in zip(indexes, items):
+            _, item = item.popitem()
+            if ok:
+                results[index] = {'id': item['_id'], 'status': item.get('status', 201)}
+            else:
+                results[index] = {'status': item.get('status', 500), 'error': str(item.get('error'))}
+        return results
+
+    def on_post(self, req, resp, *args, **kwargs):
+        """
+        Add (create) a new document or many documents, if the body is a list.
+
+        :param req: Falcon request
+        :type req: falcon.request.Request
+
+        :param resp: Falcon response
+        :type resp: falcon.response.Response
+        """
+        doc = req.context['doc'] if 'doc' in req.context else None
+        if not isinstance(doc, list):
+            return super(CollectionResource, self).on_post(req, resp, *args, **kwargs)
+
+        results = [None] * len(doc)
+        indexes = []
+        documents = []
+        for index, item in enumerate(doc):
+            if not isinstance(item, dict):
+                results[index] = {'status': 400, 'error': 'Document must be an object'}
+                continue
+            item = dict(item)
+            doc_id = item.pop('_id', None)
+            data, errors = self.clean(self.deserialize(item))
+            if errors:
+                results[index] = {'status': 400, 'errors': errors}
+                continue
+            indexes.append(index)
+            documents.append((doc_id, data))
+        for index, result in zip(indexes, self.create_bulk(req, resp, documents)):
+            results[index] = result
+
+        created = sum(1 for result in results if 'id' in result)
+        if created == len(results):
+            status_code = HTTP_CREATED
+        elif created == 0:
+            status_code = HTTP_BAD_REQUEST
+        else:
+            status_code = HTTP_207
+        self.render_response({'results': results}, req, resp, status_code)
+
 
 class SingleResource(ElasticSearchMixin, BaseSingleResource):
     """
     Allows to fetch a single resource (GET) and to update (PATCH, PUT) or remove it (DELETE).
     When fetching a resource (GET).
+
+    PATCH sends a partial update without fetching the document first, unless :py:const:`PATCH_FETCHES_OBJECT` is set
+    or :func:`get_object` or :func:`update` are overridden.
+    Following params are supported:
+
+    * if_seq_no, if_primary_term or version - update only if the document wasn't modified since then
     """
+    # set if the current document is needed when patching it, implied when get_object() or update() are overridden
+    PATCH_FETCHES_OBJECT = False
+    # number of times a partial update is retried if the document was modified concurrently
+    RETRY_ON_CONFLICT = 3
+    # return the updated document from partial updates, otherwise return only the changes
+    PATCH_RETURNS_SOURCE = True
+    PARAM_IF_SEQ_NO = 'if_seq_no'
+    PARAM_IF_PRIMARY_TERM = 'if_primary_term'
+    PARAM_VERSION = 'version'
 
     def __init__(self, objects_class, connection):
         """
@@ -567,7 +1290,101 @@ class SingleResource(ElasticSearchMixin, BaseSingleResource):
         obj.update(data)
         return self.serialize(obj)
 
+    def partial_update(self, req, resp, data, path_params):
+        """
+        Updates specified fields of a document using a single update request, without fetching it first.
+
+        :param req: Falcon request
+        :type req: falcon.request.Request
+
+        :param resp: Falcon response
+        :type resp: falcon.response.Response
+
+        :param data: changed fields
+        :type data: dict
+
+        :param path_params: positional params from the api route, containing the document id
+        :type path_params: dict
+
+        :return: the updated document if :py:const:`PATCH_RETURNS_SOURCE` is set, otherwise the changes
+        :rtype: dict
+        """
+        params = {}
+        for name in (self.PARAM_IF_SEQ_NO, self.PARAM_IF_PRIMARY_TERM, self.PARAM_VERSION):
+            value = req.params.pop(name, None)
+            if value is None:
+                continue
+            if not value.isdigit():
+                raise HTTPBadRequest('Invalid attribute', 'Value of {} attribute must be an integer'.format(name))
+            params[name] = value
+        if not params and self.RETRY_ON_CONFLICT:
+            # can't be used with optimistic concurrency control
+            params['retry_on_conflict'] = self.RETRY_ON_CONFLICT
+        if self.PATCH_RETURNS_SOURCE:
+            params['_source'] = 'true'
+        # convert values like dates using the mapping, keeping explicit nulls
+        changes = self.objects_class(**{key: value for key, value in data.items() if value is not None})
+        doc = dict(data, **changes.to_dict())
+        try:
+            response = connections.get_connection(self.connection).update(
+                index=self.objects_class._doc_type.index, doc_type=self.objects_class._doc_type.name,
+                id=list(path_params.values())[0], body={'doc': doc}, params=params)
+        except NotFoundError:
+            raise HTTPNotFound()
+        except ConflictError:
+            raise HTTPConflict('Conflict', 'Resource was modified by another request')
+        if self.PATCH_RETURNS_SOURCE and 'get' in response:
+            source = response['get']['_source']
+            return self.serialize(self.objects_class(meta={'id': response['_id']},
+                                                     **{key: value for key, value in source.items()
+                                                        if value is not None}))
+        # keep explicit nulls, skipped when serializing a document
+        result = {key: None for key, value in data.items() if value is None}
+        result.update(self.serialize(changes))
+        return result
+
+    def on_patch(self, req, resp, *args, **kwargs):
+        """
+        Updates a single document. Changes only specified fields.
+
+        :param req: Falcon request
+        :type req: falcon.request.Request
+
+        :param resp: Falcon response
+        :type resp: falcon.response.Response
+        """
+        if self.PATCH_FETCHES_OBJECT or type(self).get_object is not SingleResource.get_object \
+                or type(self).update is not SingleResource.update:
+            return super(SingleResource, self).on_patch(req, resp, *args, **kwargs)
+        data = self.deserialize(req.context['doc'] if 'doc' in req.context else None)
+        data, errors = self.clean(data)
+        if errors:
+            self.render_response({'errors': errors}, req, resp, HTTP_BAD_REQUEST)
+            return
+        self.render_response(self.partial_update(req, resp, data, kwargs), req, resp)
+
     def delete(self, req, resp, obj):
         deleted = obj.delete(using=self.connection)
         if deleted == 0:
             raise HTTPConflict('Conflict', 'Resource found but conditions violated')
+
+
+class MultiGetResource(ElasticSearchMixin, BaseMultiGetResource):
+    """
+    Allows to fetch many documents by their ids (GET, POST) using a single multi get request.
+    Following params are supported:
+    * ids - document ids, separated by commas in the query string or a list in the request body
+    """
+
+    def __init__(self, objects_class, connection):
+        """
+        :param objects_class: class represent single element of object lists that suppose to be returned
+        :param connection: ElasticSearch connection or alias
+        :type connection: elasticsearch.Elasticsearch | str
+        """
+        super(MultiGetResource, self).__init__(objects_class)
+        self.connection = connection
+
+    def get_objects(self, req, resp, ids):
+        objects = self.objects_class.mget(ids, using=self.connection, missing='skip')
+        return {obj.meta.id: self.serialize(obj) for obj in objects}
@@ -1,11 +1,16 @@
 from collections import OrderedDict
-from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, ExitStack
 from datetime import datetime, time
 from decimal import Decimal
 from enum import Enum
 
 import collections
+import contextvars
+import threading
 from functools import lru_cache
+import itertools
+import zlib
 
 import alchemyjsonschema
 import falcon
@@ -15,17 +20,21 @@ except ImportError:
     import json
 
 from falcon import HTTPConflict, HTTPBadRequest, HTTPNotFound
-from sqlalchemy import inspect
-from sqlalchemy.dialects.postgresql import TSVECTOR
-from sqlalchemy.exc import IntegrityError, ProgrammingError
-from sqlalchemy.orm import sessionmaker, subqueryload, aliased
+from sqlalchemy import inspect, tablesample, tuple_, Column, Index, MetaData, Table
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR, aggregate_order_by
+from sqlalchemy.exc import CompileError, IntegrityError, ProgrammingError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker, subqueryload, selectinload, aliased
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.orm.base import MANYTOONE
 from sqlalchemy.orm.exc import NoResultFound, MultipleResultsFound
 from sqlalchemy.sql import sqltypes, operators, extract, func
-from sqlalchemy.sql.expression import and_, or_, not_, desc, select
+from sqlalchemy.sql.expression import and_, or_, not_, desc, select, text, null, literal, union_all, case, cast, \
+    bindparam, ClauseElement, ColumnElement, Executable
 from sqlalchemy.sql.functions import Function
 
-from falcon_dbapi.resources.base import BaseCollectionResource, BaseSingleResource
+from falcon_dbapi.resources.base import BaseCollectionResource, BaseSingleResource, BaseMultiGetResource, RawJSON
+from falcon_dbapi.sketches import HyperLogLog, TDigest
 
 
 def _is_int(s):
@@ -36,6 +45,115 @@ def _is_int(s):
     return True
 
 
+class LargeIn(ColumnElement):
+    """
+    An `IN` or `NOT IN` expression for long lists of values. On PostgreSQL the list is bound as a single array,
+    other dialects render values as literals to avoid creating a bind parameter for each of them.
+    """
+    type = sqltypes.Boolean()
+
+    def __init__(self, expression, values, negate=False):
+        """
+        :param expression: left side of the operator
+        :type expression: sqlalchemy.sql.expression.ColumnElement
+
+        :param values: list of values
+        :type values: list
+
+        :param negate: if True, `NOT IN` is used
+        :type negate: bool
+        """
+        if hasattr(expression, '__clause_element__'):
+            expression = expression.__clause_element__()
+        self.left = expression
+        self.values = values
+        self.negate = negate
+
+    def self_group(self, against=None):
+        # rendered as a complete predicate, skip comparing it to a boolean on dialects without native booleans
+        return self
+
+    def _negate(self):
+        return LargeIn(self.left, self.values, negate=not self.negate)
+
+    @property
+    def _from_objects(self):
+        return self.left._from_objects
+
+    def get_children(self, **kwargs):
+        return self.left,
+
+    def _copy_internals(self, clone=lambda element, **kw: element._clone(), **kw):
+        self.left = clone(self.left, **kw)
+
+
+@compiles(LargeIn)
+def _compile_large_in(element, compiler, **kw):
+    left = element.left
+    op = left.notin_ if element.negate else left.in_
+    try:
+        return compiler.process(op([literal(value, left.type) for value in element.values]),
+                                **dict(kw, literal_binds=True))
+    except (NotImplementedError, CompileError):
+        # values of this type can't be rendered as literals
+        return compiler.process(op(element.values), **kw)
+
+
+@compiles(LargeIn, 'postgresql')
+def _compile_large_in_postgresql(element, compiler, **kw):
+    values = bindparam('values', element.values, type_=ARRAY(element.left.type), unique=True)
+    return '{} {} {}({})'.format(compiler.process(element.left, **kw), '!=' if element.negate else '=',
+                                 'ALL' if element.negate else 'ANY', compiler.process(values, **kw))
+
+
+class Explain(Executable, ClauseElement):
+    """
+    An `EXPLAIN` statement returning the plan of another statement as JSON.
+    """
+
+    def __init__(self, statement):
+        """
+        :param statement: statement to explain
+        :type statement: sqlalchemy.sql.expression.Select
+        """
+        self.statement = statement
+
+
+@compiles(Explain, 'postgresql')
+def _compile_explain_postgresql(element, compiler, **kw):
+    return 'EXPLAIN (FORMAT JSON) ' + compiler.process(element.statement, **kw)
+
+
+class ClosingStream(object):
+    """
+    Response stream closing a scope, like a db session, after it's sent or when the server closes it earlier.
+    """
+
+    def __init__(self, chunks, scope):
+        """
+        :param chunks: chunks of the response body
+        :type chunks: generator
+
+        :param scope: exit stack closed after the last chunk
+        :type scope: contextlib.ExitStack
+        """
+        self.scope = scope
+        self._chunks = self._iterate(chunks, scope)
+
+    @staticmethod
+    def _iterate(chunks, scope):
+        with scope:
+            yield from chunks
+
+    def __iter__(self):
+        return self._chunks
+
+    def close(self):
+        self._chunks.close()
+        # the scope is not entered if the stream was never read
+        self.scope.close()
+
+
 class AlchemyMixin(object):
     """
     Provides serialize and deserialize methods to convert between JSON and SQLAlchemy datatypes.
@@ -44,8 +162,12 @@ class AlchemyMixin(object):
     PARAM_RELATIONS = 'relations'
     PARAM_RELATIONS_ALL = '_all'
     DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+    # strftime directives mapped to PostgreSQL to_char() patterns
+    TO_CHAR_PATTERNS = {'Y': 'YYYY', 'm': 'MM', 'd': 'DD', 'H': 'HH24', 'M': 'MI', 'S': 'SS', 'f': 'US', '%': '%'}
     RELATIONS_AS_LIST = True
     IGNORE_UNKNOWN_FILTER = False
+    # `in` and `notin` filters with more values are built using :class:`LargeIn`, None disables it
+    LARGE_IN_THRESHOLD = 1000
 
     _underscore_operators = {
         'exact':        operators.eq,
@@ -177,6 +299,114 @@ class AlchemyMixin(object):
             return value.value
         return value
 
+    @classmethod
+    def serialize_column_expression(cls, column, value, dialect_name):
+        """
+        Builds an SQL expression that serializes a column the same way as :func:`serialize_column`,
+        so it can be rendered as JSON by the database.
+
+        :param column: mapped column
+        :type column: sqlalchemy.Column
+
+        :param value: expression selecting the column value
+        :type value: sqlalchemy.sql.expression.ColumnElement
+
+        :param dialect_name: either `postgresql` or `sqlite`
+        :type dialect_name: str
+
+        :return: an expression or None if the column should be skipped
+        :rtype: sqlalchemy.sql.expression.ColumnElement | None
+        """
+        if isinstance(column.type, TSVECTOR):
+            return None
+        if isinstance(column.type, sqltypes.DateTime):
+            if dialect_name == 'postgresql':
+                return func.to_char(value, cls.to_char_format(cls.DATETIME_FORMAT))
+            return func.strftime(cls.DATETIME_FORMAT, value)
+        if isinstance(column.type, sqltypes.Time):
+            if dialect_name == 'postgresql':
+                return func.to_char(value, cls.to_char_format('%H:%M:%S'))
+            return func.strftime('%H:%M:%S', value)
+        if isinstance(column.type, sqltypes.Enum) and getattr(column.type, 'enum_class', None) is not None:
+            return case([(value == member.name, literal(member.value)) for member in column.type.enum_class],
+                        else_=null())
+        if isinstance(column.type, sqltypes.Numeric) and column.type.asdecimal:
+            return cast(value, sqltypes.Float)
+        if dialect_name == 'sqlite':
+            if isinstance(column.type, sqltypes.Boolean):
+                # SQLite stores booleans as integers, json() marks the literal as JSON instead of text
+                return case([(value.is_(None), null())],
+                            else_=func.json(case([(value != 0, 'true')], else_='false')))
+            if isinstance(column.type, sqltypes.JSON):
+                return func.json(value)
+        return value
+
+    @classmethod
+    def to_char_format(cls, strftime_format):
+        """
+        Converts a strftime format into a PostgreSQL to_char() format.
+
+        :param strftime_format: format using only directives from `TO_CHAR_PATTERNS`
+        :type strftime_format: str
+
+        :rtype: str
+        """
+        result = []
+        chars = iter(strftime_format)
+        for char in chars:
+            if char != '%':
+                result.append('"{}"'.format(char) if char.isalpha() else char)
+                continue
+            directive = next(chars, '')
+            if directive not in cls.TO_CHAR_PATTERNS:
+                raise ValueError('Unsupported format directive %{}'.format(directive))
+            result.append(cls.TO_CHAR_PATTERNS[directive])
+        return ''.join(result)
+
+    @classmethod
+    def serialize_normalized(cls, obj, included, relations_ignore=None, relations_include=None):
+        """
+        Converts the object to a serializable dictionary, replacing related objects with their primary keys
+        and adding each of them only once to the `included` dict.
+
+        :param obj: the object to serialize
+
+        :param included: serialized related objects, by class name and then by primary key
+        :type included: dict
+
+        :param relations_ignore: relationship names to ignore
+        :type relations_ignore: list
+
+        :param relations_include: relationship names to include
+        :type relations_include: list
+
+        :return: a serializable dictionary
+        :rtype: dict
+        """
+        data = cls.serialize(obj, relations_level=0)
+        mapper = inspect(obj).mapper
+        for relation in mapper.relationships:
+            if relation.key in (relations_ignore or [])\
+                    or (relations_include is not None and relation.key not in relations_include):
+                continue
+            rel_obj = getattr(obj, relation.key)
+            if rel_obj is None:
+                continue
+            if relation.uselist:
+                data[relation.key] = [cls._include_object(rel, included) for rel in rel_obj]
+            else:
+                data[relation.key] = cls._include_object(rel_obj, included)
+        return data
+
+    @classmethod
+    def _include_object(cls, obj, included):
+        state = inspect(obj)
+        objects = included.setdefault(state.mapper.class_.__name__, OrderedDict())
+        key = cls.MULTIVALUE_SEPARATOR.join(str(value) for value in state.identity)
+        if key not in objects:
+            objects[key] = cls.serialize(obj, relations_level=0)
+        return key
+
     @classmethod
     def serialize_relations(cls, obj, data, relations_level=1, relations_ignore=None, relations_include=None):
         mapper = inspect(obj).mapper
@@ -345,6 +575,7 @@ class AlchemyMixin(object):
         :return: modified query
         :rtype: sqlalchemy.orm.query.Query
         """
+        self.check_filter_complexity(conditions, self._logical_operators)
         relationships = {
             'aliases': {},
             'join_chains': [],
@@ -457,7 +688,7 @@ class AlchemyMixin(object):
         op = self._underscore_operators[token]
 
         if op != Function:
-            return op(column_name, value)
+            return self._apply_operator(op, column_name, value)
 
         expression = column_name
         if len(tokens[index+1:]) > 1:
@@ -469,13 +700,48 @@ class AlchemyMixin(object):
                     expression = Function(func_name, expression)
 
         if tokens[-1] in self._underscore_operators:
-            return self._underscore_operators[tokens[-1]](expression, value)
+            return self._apply_operator(self._underscore_operators[tokens[-1]], expression, value)
 
         if token == 'sfunc':
             return Function(tokens[-1], expression)
 
         return Function(tokens[-1], expression, value)
 
+    def _apply_operator(self, op, expression, value):
+        if op in (operators.in_op, operators.notin_op) and isinstance(value, list) \
+                and self.LARGE_IN_THRESHOLD is not None and len(value) > self.LARGE_IN_THRESHOLD:
+            return LargeIn(expression, self._coerce_numbers(expression, value), negate=op == operators.notin_op)
+        return op(expression, value)
+
+    @staticmethod
+    def _coerce_numbers(expression, values):
+        """
+        Converts values compared to a numeric expression, because they're rendered as literals or bound as an array
+        instead of separate bind parameters.
+
+        :param expression: left side of the operator
+        :type expression: sqlalchemy.sql.expression.ColumnElement
+
+        :param values: list of values
+        :type values: list
+
+        :return: converted values
+        :rtype: list
+
+        :raises falcon.HTTPBadRequest: if any value is not a number
+        """
+        try:
+            python_type = expression.type.python_type
+        except (AttributeError, NotImplementedError):
+            return values
+        if python_type not in (int, float, Decimal):
+            return values
+        try:
+            return [python_type(value) if value is not None else None for value in values]
+        except (TypeError, ValueError, ArithmeticError):
+            raise HTTPBadRequest('Invalid attribute', 'Values of {} filter are invalid, numbers are expected'.format(
+                getattr(expression, 'key', expression)))
+
     def _parse_tokens(self, obj_class, tokens, value, relationships, default_expression=None):
         column_name = None
         column = None
@@ -501,10 +767,14 @@ class AlchemyMixin(object):
                         value = [value]
                 # isnull is the only operator where the value is not of the same type as the column
                 if token != 'isnull' and token != 'isnotnull':
-                    if isinstance(value, list):
-                        value = list(map(lambda x: self.deserialize_column(column, x), value))
-                    else:
-                        value = self.deserialize_column(column, value)
+                    try:
+                        if isinstance(value, list):
+                            value = list(map(lambda x: self.deserialize_column(column, x), value))
+                        else:
+                            value = self.deserialize_column(column, value)
+                    except (TypeError, ValueError):
+                        raise HTTPBadRequest('Invalid attribute', 'Value of {} param is invalid'.format(
+                            '__'.join(tokens)))
 
                 expression = self._build_expression(tokens, index, column_name, value, obj_class, relationships)
 
@@ -520,6 +790,10 @@ class AlchemyMixin(object):
                 mapper = mapper.relationships[token].mapper
                 column_alias, is_new_alias = self.next_alias(relationships['aliases'], token, obj_class,
                                                              prefix=relationships.get('prefix', ''))
+                if self.MAX_FILTER_JOINS is not None and len(join_chain) >= self.MAX_FILTER_JOINS:
+                    raise HTTPBadRequest('Invalid attribute', 'Param {} is invalid, can\'t join more than {} '
+                                                              'relations'.format('__'.join(tokens),
+                                                                                 self.MAX_FILTER_JOINS))
                 join_chain.append(token)
                 join_chain_ext.append((column_alias, token))
                 continue
@@ -802,6 +1076,226 @@ class AlchemyMixin(object):
         return schema
 
 
+class Rollup(object):
+    """
+    A summary table with pre-aggregated metrics of a collection resource, grouped by all declared dimensions.
+    Used to answer matching `totals` requests without scanning the base table.
+
+    The summary table is refreshed incrementally, by aggregating only base rows with a watermark column value greater
+    than the last one merged, so it's suited for append-only tables. Call :func:`rebuild` after updating
+    or deleting base rows.
+    """
+    MERGEABLE_AGGREGATES = ('count', 'sum', 'min', 'max')
+    WATERMARK_COLUMN = '_watermark'
+
+    def __init__(self, name, dimensions, metrics, watermark, metadata=None):
+        """
+        :param name: name of the summary table
+        :type name: str
+
+        :param dimensions: group by expressions using the filter syntax, ex. `created_at__sfunc__date_trunc_month`,
+                           or tuples of an expression and a column type, when it can't be detected
+        :type dimensions: list[str | tuple]
+
+        :param metrics: tuples of an aggregate function name and a column name, ex. `('sum', 'value')`,
+                        column name can be None only for `count`
+        :type metrics: list[tuple]
+
+        :param watermark: base table column name, its values can't decrease for new rows, ex. an autoincrement key
+        :type watermark: str
+
+        :param metadata: metadata to add the summary table to
+        :type metadata: sqlalchemy.schema.MetaData
+        """
+        for aggregate, column in metrics:
+            if aggregate not in self.MERGEABLE_AGGREGATES:
+                raise ValueError('Aggregate {} can\'t be maintained incrementally'.format(aggregate))
+            if not column and aggregate != 'count':
+                raise ValueError('Aggregate {} requires a column name'.format(aggregate))
+        self.name = name
+        self.dimensions = OrderedDict((dimension, None) if isinstance(dimension, str) else dimension
+                                      for dimension in dimensions)
+        self.metrics = [(aggregate, column or None) for aggregate, column in metrics]
+        self.watermark = watermark
+        self.metadata = metadata if metadata is not None else MetaData()
+        self.resource = None
+        self.table = None
+        self._dimension_expressions = OrderedDict()
+        self._metric_expressions = OrderedDict()
+
+    @staticmethod
+    def metric_name(aggregate, column):
+        return aggregate if column is None else '{}__{}'.format(aggregate, column)
+
+    def bind(self, resource):
+        """
+        Builds expressions for all dimensions and metrics and defines the summary table.
+
+        :param resource: collection resource of the base table
+        :type resource: CollectionResource
+        """
+        objects_class = resource.objects_class
+        relationships = {
+            'aliases': {},
+            'join_chains': [],
+        }
+        columns = []
+        for name, column_type in self.dimensions.items():
+            expression = resource._parse_tokens(objects_class, name.split('__'), None, relationships,
+                                                lambda c, n, v: n)
+            if column_type is None:
+                column_type = expression.type if not isinstance(expression.type, sqltypes.NullType) \
+                    else sqltypes.String()
+            self._dimension_expressions[name] = expression
+            columns.append(Column(name, column_type))
+        for aggregate, column in self.metrics:
+            name = self.metric_name(aggregate, column)
+            if column is None:
+                self._metric_expressions[name] = func.count()
+                columns.append(Column(name, sqltypes.Integer))
+                continue
+            expression = resource._parse_tokens(objects_class, column.split('__'), None, relationships,
+                                                lambda c, n, v: n)
+            self._metric_expressions[name] = Function(aggregate, expression)
+            if aggregate == 'count':
+                column_type = sqltypes.Integer()
+            else:
+                column_type = expression.type if not isinstance(expression.type, sqltypes.NullType) \
+                    else sqltypes.Numeric()
+            columns.append(Column(name, column_type))
+        if relationships['join_chains']:
+            raise ValueError('Rollup {} can only use columns of the base table'.format(self.name))
+        watermark = inspect(objects_class).columns[self.watermark]
+        columns.append(Column(self.WATERMARK_COLUMN, watermark.type))
+        if self.dimensions:
+            columns.append(Index('ix_{}_dimensions'.format(self.name), *self.dimensions.keys()))
+        self.table = Table(self.name, self.metadata, *columns)
+        self.resource = resource
+
+    def refresh(self, db_session):
+        """
+        Aggregates base rows added since the last refresh and merges them into the summary table.
+
+        :param db_session: SQLAlchemy session
+        :type db_session: sqlalchemy.orm.session.Session
+
+        :return: number of inserted or updated summary rows
+        :rtype: int
+        """
+        last_watermark = db_session.execute(select([func.max(self.table.c[self.WATERMARK_COLUMN])])).scalar()
+        watermark = getattr(self.resource.objects_class, self.watermark)
+        columns = [expression.label(name) for name, expression in self._dimension_expressions.items()]
+        columns += [expression.label(name) for name, expression in self._metric_expressions.items()]
+        columns.append(func.max(watermark).label(self.WATERMARK_COLUMN))
+        query = db_session.query(*columns)
+        if last_watermark is not None:
+            query = query.filter(watermark > last_watermark)
+        if self._dimension_expressions:
+            query = query.group_by(*self._dimension_expressions.values())
+        merged = 0
+        for row in db_session.execute(query.statement):
+            if row[self.WATERMARK_COLUMN] is None:
+                # no new rows at all, only possible without any dimensions
+                continue
+            self._merge_row(db_session, row)
+            merged += 1
+        return merged
+
+    def rebuild(self, db_session):
+        """
+        Removes all summary rows and aggregates the whole base table again.
+
+        :param db_session: SQLAlchemy session
+        :type db_session: sqlalchemy.orm.session.Session
+
+        :return: number of inserted summary rows
+        :rtype: int
+        """
+        db_session.execute(self.table.delete())
+        return self.refresh(db_session)
+
+    def _merge_row(self, db_session, row):
+        key = [self.table.c[name] == row[name] if row[name] is not None else self.table.c[name].is_(None)
+               for name in self.dimensions]
+        values = {name: row[name] for name in self._metric_expressions}
+        values[self.WATERMARK_COLUMN] = row[self.WATERMARK_COLUMN]
+        existing_query = select([self.table])
+        if key:
+            existing_query = existing_query.where(and_(*key))
+        existing = db_session.execute(existing_query).first()
+        if existing is None:
+            values.update({name: row[name] for name in self.dimensions})
+            db_session.execute(self.table.insert().values(values))
+            return
+        for aggregate, column in self.metrics:
+            name = self.metric_name(aggregate, column)
+            values[name] = self._merge_value(aggregate, existing[name], values[name])
+        values[self.WATERMARK_COLUMN] = max(existing[self.WATERMARK_COLUMN], values[self.WATERMARK_COLUMN])
+        update_query = self.table.update()
+        if key:
+            update_query = update_query.where(and_(*key))
+        db_session.execute(update_query.values(values))
+
+    @staticmethod
+    def _merge_value(aggregate, old, new):
+        if old is None or new is None:
+            return new if old is None else old
+        if aggregate == 'min':
+            return min(old, new)
+        if aggregate == 'max':
+            return max(old, new)
+        return old + new
+
+    def build_total_expressions(self, totals):
+        """
+        Builds an aggregate query using the summary table, if it contains all dimensions and metrics requested.
+
+        :param totals: a list of dicts with aggregate function as key and column as value
+        :type totals: list
+
+        :return: aggregate query and dimension names or None if totals can't be answered from this rollup
+        :rtype: tuple | None
+        """
+        aggregates = []
+        group_cols = OrderedDict()
+        group_limit = None
+        for total in totals:
+            for aggregate, columns in total.items():
+                if aggregate == self.resource.AGGR_GROUPLIMIT:
+                    if not isinstance(columns, int):
+                        return None
+                    group_limit = columns
+                    continue
+                if aggregate == self.resource.AGGR_ROLLUP:
+                    if columns:
+                        return None
+                    continue
+                if not columns:
+                    if aggregate != 'count':
+                        return None
+                    columns = [None]
+                if not isinstance(columns, list):
+                    columns = [columns]
+                for column in columns:
+                    if aggregate == self.resource.AGGR_GROUPBY:
+                        if not isinstance(column, str) or column not in self.dimensions:
+                            return None
+                        group_cols[column] = self.table.c[column].label(column)
+                        continue
+                    if not isinstance(column, (str, type(None))) or (aggregate, column) not in self.metrics:
+                        return None
+                    # partial counts are summed up, other aggregates are applied again
+                    rollup_aggregate = 'sum' if aggregate == 'count' else aggregate
+                    aggregates.append(Function(rollup_aggregate,
+                                               self.table.c[self.metric_name(aggregate, column)]).label(aggregate))
+        if not aggregates:
+            return None
+        group_by = [self.table.c[column] for column in group_cols]
+        agg_query = self.resource._group_total_query(select([self.table]), list(group_cols.values()), aggregates,
+                                                     group_by, group_limit)
+        return agg_query, list(group_cols.keys())
+
+
 class CollectionResource(AlchemyMixin, BaseCollectionResource):
     """
     Allows to fetch a collection of a resource (GET) and to create new resource in that collection (POST).
@@ -814,8 +1308,32 @@ class CollectionResource(AlchemyMixin, BaseCollectionResource):
     User input can be validated by attaching the `falconjsonio.schema.request_schema()` decorator.
     """
     VIOLATION_UNIQUE = '23505'
-
-    def __init__(self, objects_class, db_engine, max_limit=None, eager_limit=None):
+    STREAM_BATCH_SIZE = 500
+    # write streamed results to the response body as they're serialized, instead of building the whole result first
+    STREAM_RESPONSE = True
+    ROLLUP_DIALECTS = ('postgresql', 'mssql', 'oracle')
+    ROLLUP_GROUPING_PREFIX = 'grouping__'
+    # subtotals are returned under the key of the aggregate with this suffix, apart from groups
+    ROLLUP_SUFFIX = '_rollup'
+    APPROX_NATIVE_DIALECTS = ('oracle', 'mssql')
+    TABLESAMPLE_DIALECTS = ('postgresql',)
+    TABLESAMPLE_METHOD = 'system'
+    APPROX_COUNT_DISTINCT_PRECISION = 14
+    # max number of groups of approximate aggregates calculated in Python, every group allocates its own sketches
+    APPROX_MAX_GROUPS = 1000
+    JSON_DIALECTS = ('postgresql', 'sqlite')
+    EXPLAIN_DIALECTS = ('postgresql',)
+    RELATION_LIMIT_SEPARATOR = ':'
+    RELATION_OMITTED_SUFFIX = '_omitted'
+    PARAM_RELATION_COUNTS = 'relation_counts'
+    PARAM_NORMALIZE = 'normalize'
+    RELATION_COUNT_SUFFIX = '_count'
+    EXPLAIN_CACHE_SIZE = 1000
+    # when enabled, list results without relations are rendered as JSON by the database
+    RENDER_JSON_IN_DB = False
+
+    def __init__(self, objects_class, db_engine, max_limit=None, eager_limit=None, rollups=None, stream_limit=None,
+                 max_cost=None):
         """
         :param objects_class: class represent single element of object lists that suppose to be returned
 
@@ -828,14 +1346,43 @@ class CollectionResource(AlchemyMixin, BaseCollectionResource):
         :param eager_limit: if None or the value of limit param is greater than this, subquery eager loading
                             will be enabled
         :type eager_limit: int
+
+        :param rollups: summary tables used to answer matching totals requests, see :class:`Rollup`
+        :type rollups: list[Rollup]
+
+        :param stream_limit: if the limit is None or greater than this, results are fetched using a server side cursor
+                             and serialized in batches written to the response body, None (default) disables it
+        :type stream_limit: int | None
+
+        :param max_cost: requests with a query estimated by the database planner to cost more than this are rejected,
+                         None disables checking
+        :type max_cost: float | None
         """
         super(CollectionResource, self).__init__(objects_class, max_limit)
         self.db_engine = db_engine
         self.eager_limit = eager_limit
+        self.stream_limit = stream_limit
+        self.max_cost = max_cost
+        self._costs = OrderedDict()
+        self._costs_lock = threading.Lock()
+        self.rollups = list(rollups or [])
+        for rollup in self.rollups:
+            rollup.bind(self)
         if not hasattr(self, '__request_schemas__'):
             self.__request_schemas__ = {}
         self.__request_schemas__['POST'] = AlchemyMixin.get_default_schema(objects_class, 'POST')
 
+    def get_db_engine(self, req):
+        """
+        Return the engine used to handle a request.
+
+        :param req: Falcon request
+        :type req: falcon.request.Request
+
+        :rtype: sqlalchemy.engine.Engine
+        """
+        return self.db_engine
+
     def get_eager_queryset(self, req, resp, db_session=None, limit=None):
         """
         Return a default query with eager options set if any relations has been requested.
@@ -858,6 +1405,8 @@ class CollectionResource(AlchemyMixin, BaseCollectionResource):
         relations = self.clean_relations(self.get_param_or_post(req, self.PARAM_RELATIONS, ''))
         if self.eager_limit is not None and (limit is None or limit <= self.eager_limit):
             return query
+        # relations with a limit are loaded separately, after fetching the page
+        relations, _ = self.split_relation_limits(relations)
         if relations is None:
             query = query.options(subqueryload('*'))
         elif len(relations):
@@ -867,7 +1416,237 @@ class CollectionResource(AlchemyMixin, BaseCollectionResource):
 
     def get_special_params(self):
         return [self.PARAM_LIMIT, self.PARAM_OFFSET, self.PARAM_TOTAL_COUNT, self.PARAM_TOTALS, self.PARAM_TEXT_QUERY,
-                self.PARAM_RELATIONS]
+                self.PARAM_RELATIONS, self.PARAM_SAMPLE, self.PARAM_SAMPLE_SEED, self.PARAM_RELATION_COUNTS,
+                self.PARAM_NORMALIZE]
+
+    def get_param_relation_counts(self, req):
+        """
+        Gets and validates names of relations to count.
+
+        :param req: Falcon request
+        :type req: falcon.request.Request
+
+        :return: names of to-many relations
+        :rtype: list[str]
+        """
+        relations = self.get_param_or_post(req, self.PARAM_RELATION_COUNTS, '')
+        if isinstance(relations, str):
+            relations = [relation for relation in relations.split(self.MULTIVALUE_SEPARATOR) if relation]
+        mapper = inspect(self.objects_class)
+        for relation in relations:
+            if relation not in mapper.relationships or not mapper.relationships[relation].uselist:
+                raise HTTPBadRequest('Invalid attribute', 'Value of {} param is invalid, {} is expected to be '
+                                                          'a to-many relation'.format(self.PARAM_RELATION_COUNTS,
+                                                                                      relation))
+        return relations
+
+    def count_relations(self, db_session, objects, relation_counts):
+        """
+        Counts related objects of all objects using a single grouped query for every relation,
+        without loading them.
+
+        :param db_session: SQLAlchemy session
+        :type db_session: sqlalchemy.orm.session.Session
+
+        :param objects: objects to count relations for
+        :type objects: list
+
+        :param relation_counts: names of to-many relations, from :func:`get_param_relation_counts`
+        :type relation_counts: list[str]
+
+        :return: number of related objects of every relation, by primary key of an object
+        :rtype: dict
+        """
+        mapper = inspect(self.objects_class)
+        if not objects or not relation_counts:
+            return {}
+        if len(mapper.primary_key) != 1:
+            raise HTTPBadRequest('Invalid attribute', 'Relation counts are not supported by this resource')
+        parent_key = mapper.primary_key[0]
+        keys = [mapper.primary_key_from_instance(obj)[0] for obj in objects]
+        counts = collections.defaultdict(dict)
+        for name in relation_counts:
+            target = aliased(mapper.relationships[name].mapper.class_)
+            query = db_session.query(parent_key, func.count())\
+                .select_from(self.objects_class).join(target, getattr(self.objects_class, name))\
+                .filter(parent_key.in_(keys)).group_by(parent_key)
+            found = dict(query.all())
+            for key in keys:
+                counts[key][name] = found.get(key, 0)
+        return counts
+
+    def split_relation_limits(self, relations):
+        """
+        Separates to-many relations with a limit and an optional order, like `comments:5:-created_at`,
+        from other relation names.
+
+        :param relations: relations from :func:`clean_relations`
+        :type relations: list[str] | None
+
+        :return: relation names without a limit and a dict mapping names of relations with a limit
+                 to the limit and a list of order expressions
+        :rtype: tuple[list[str] | None, dict]
+        """
+        if relations is None:
+            return None, {}
+        mapper = inspect(self.objects_class)
+        names = []
+        limits = OrderedDict()
+        for relation in relations:
+            if self.RELATION_LIMIT_SEPARATOR not in relation:
+                names.append(relation)
+                continue
+            name, _, rest = relation.partition(self.RELATION_LIMIT_SEPARATOR)
+            limit, _, order = rest.partition(self.RELATION_LIMIT_SEPARATOR)
+            if name not in mapper.relationships or not mapper.relationships[name].uselist:
+                raise HTTPBadRequest('Invalid attribute', 'Relation {} is invalid, a limit can only be used '
+                                                          'with a to-many relation'.format(relation))
+            if not _is_int(limit) or int(limit) < 1:
+                raise HTTPBadRequest('Invalid attribute', 'Relation {} is invalid, limit must be '
+                                                          'a positive integer'.format(relation))
+            target = mapper.relationships[name].mapper
+            column = order[1:] if order.startswith('-') else order
+            if order and column not in target.column_attrs:
+                raise HTTPBadRequest('Invalid attribute', 'Relation {} is invalid, {} is expected to be a known '
+                                                          'column name'.format(relation, column))
+            limits[name] = (int(limit), order)
+        return names, limits
+
+    def load_limited_relations(self, db_session, objects, relation_limits):
+        """
+        Loads only first N elements of to-many relations of all objects using a single window function query
+        for every relation, assigning them as if they were the whole relation.
+
+        :param db_session: SQLAlchemy session
+        :type db_session: sqlalchemy.orm.session.Session
+
+        :param objects: objects to load relations for
+        :type objects: list
+
+        :param relation_limits: relation names mapped to a limit and an order, from :func:`split_relation_limits`
+        :type relation_limits: dict
+
+        :return: number of omitted elements of every relation, by primary key of an object
+        :rtype: dict
+        """
+        mapper = inspect(self.objects_class)
+        if not objects or not relation_limits:
+            return {}
+        if len(mapper.primary_key) != 1:
+            raise HTTPBadRequest('Invalid attribute', 'Relation limits are not supported by this resource')
+        parent_key = mapper.primary_key[0]
+        objects = OrderedDict((mapper.primary_key_from_instance(obj)[0], obj) for obj in objects)
+        omitted = collections.defaultdict(dict)
+        for name, (limit, order) in relation_limits.items():
+            target_class = mapper.relationships[name].mapper.class_
+            target = aliased(target_class)
+            order_by = []
+            if order:
+                column = getattr(target, order.lstrip('-'))
+                order_by.append(desc(column) if order.startswith('-') else column)
+            order_by.extend(getattr(target, key.key) for key in inspect(target_class).primary_key)
+            ranked = db_session.query(parent_key.label('_parent_key'), target,
+                                      func.row_number().over(partition_by=parent_key, order_by=order_by)
+                                      .label('_rank'),
+                                      func.count().over(partition_by=parent_key).label('_total'))\
+                .select_from(self.objects_class).join(target, getattr(self.objects_class, name))\
+                .filter(parent_key.in_(list(objects.keys()))).subquery()
+            children = collections.defaultdict(list)
+            totals = {}
+            query = db_session.query(ranked.c._parent_key, aliased(target_class, ranked), ranked.c._total)\
+                .filter(ranked.c._rank <= limit).order_by(ranked.c._parent_key, ranked.c._rank)
+            for key, child, total in query:
+                children[key].append(child)
+                totals[key] = total
+            for key, obj in objects.items():
+                set_committed_value(obj, name, children[key])
+                omitted[key][name] = totals.get(key, 0) - len(children[key])
+        return omitted
+
+    def serialize_objects(self, db_session, objects, relations, relation_limits=None, relation_counts=None,
+                          included=None):
+        """
+        Serializes objects, loading first N elements of relations with a limit and counting related objects.
+
+        :param db_session: SQLAlchemy session
+        :type db_session: sqlalchemy.orm.session.Session
+
+        :param objects: objects to serialize
+        :type objects: list
+
+        :param relations: relation names to include or None for all relations
+        :type relations: list[str] | None
+
+        :param relation_limits: relation names mapped to a limit and an order, from :func:`split_relation_limits`
+        :type relation_limits: dict | None
+
+        :param relation_counts: names of relations to count, from :func:`get_param_relation_counts`
+        :type relation_counts: list[str] | None
+
+        :param included: if not None, related objects are added to it by :func:`serialize_normalized`
+                         instead of being embedded in results
+        :type included: dict | None
+
+        :return: serialized objects
+        :rtype: list[dict]
+        """
+        omitted = self.load_limited_relations(db_session, objects, relation_limits or {})
+        counts = self.count_relations(db_session, objects, relation_counts or [])
+        if relations is not None and relation_limits:
+            relations = relations + list(relation_limits.keys())
+        mapper = inspect(self.objects_class)
+        result = []
+        for obj in objects:
+            if included is not None:
+                data = self.serialize_normalized(obj, included, relations_include=relations,
+                                                 relations_ignore=list(getattr(self, 'serialize_ignore', [])))
+            else:
+                data = self.serialize(obj, relations_include=relations,
+                                      relations_ignore=list(getattr(self, 'serialize_ignore', [])))
+            if omitted or counts:
+                key = mapper.primary_key_from_instance(obj)[0]
+                for name, count in omitted.get(key, {}).items():
+                    data[name + self.RELATION_OMITTED_SUFFIX] = count
+                for name, count in counts.get(key, {}).items():
+                    data[name + self.RELATION_COUNT_SUFFIX] = count
+            result.append(data)
+        return result
+
+    def get_sample_expression(self, sample, seed=None, dialect_name=None):
+        """
+        Return a filter expression selecting a sample of rows. Uses TABLESAMPLE when the dialect supports it
+        and a keyed hash of the primary key otherwise.
+
+        :param sample: percentage of rows to select
+        :type sample: float
+
+        :param seed: makes the sample repeatable
+        :type seed: int | None
+
+        :param dialect_name: name of the database dialect
+        :type dialect_name: str
+
+        :return: a filter expression
+        """
+        mapper = inspect(self.objects_class)
+        primary_keys = mapper.primary_key
+        if dialect_name in self.TABLESAMPLE_DIALECTS:
+            sampled = tablesample(mapper.local_table, Function(self.TABLESAMPLE_METHOD, sample),
+                                  name='sample_' + mapper.local_table.name,
+                                  seed=literal(seed) if seed is not None else None)
+            sampled_keys = [sampled.c[column.name] for column in primary_keys]
+            if len(primary_keys) > 1:
+                return tuple_(*primary_keys).in_(select(sampled_keys))
+            return primary_keys[0].in_(select(sampled_keys))
+        if len(primary_keys) != 1 or not isinstance(primary_keys[0].type, sqltypes.Integer):
+            raise HTTPBadRequest('Invalid attribute', 'Sampling requires a single integer primary key')
+        # a multiplicative hash modulo a prime spreads consecutive keys evenly, the seed is mixed into the key
+        # and selects the multiplier, so every seed selects a different sample instead of shifting hash values;
+        # the key is reduced first, so the product stays below 2^62 and doesn't overflow a 64-bit integer
+        seed = (seed or 0) % 2147483647
+        multiplier = pow(48271, seed + 1, 2147483647)
+        hashed = ((primary_keys[0] % 2147483647 + seed) % 2147483647 * multiplier) % 2147483647
+        return hashed % 10000 < int(round(sample * 100))
 
     def get_queryset(self, req, resp, db_session=None, limit=None):
         """
@@ -879,7 +1658,7 @@ class CollectionResource(AlchemyMixin, BaseCollectionResource):
         :param resp: Falcon response
         :type resp: falcon.response.Response
 
-        :param db_session: SQLAlchemy session
+        :param db_session: SQLAlchemy session, the `db_engine` is used to detect the dialect if not set
         :type db_session: sqlalchemy.orm.session.Session
 
         :param limit: max number of records fetched
@@ -888,6 +1667,11 @@ class CollectionResource(AlchemyMixin, BaseCollectionResource):
         :return: a query from `object_class`
         """
         query = self.get_eager_queryset(req, resp, db_session, limit)
+        sample, seed = self.get_param_sample(req)
+        if sample is not None and sample < 100:
+            bind = db_session.get_bind(inspect(self.objects_class)) if db_session is not None else self.db_engine
+            dialect_name = bind.dialect.name
+            query = query.filter(self.get_sample_expression(sample, seed, dialect_name))
         conditions = {}
         if 'doc' in req.context:
             conditions = dict(req.context['doc'])
@@ -920,10 +1704,86 @@ class CollectionResource(AlchemyMixin, BaseCollectionResource):
             order = [order]
         return self.filter_by(query, conditions, order)
 
+    def refresh_rollups(self, rebuild=False):
+        """
+        Merges new base table rows into all summary tables. Should be called periodically.
+
+        :param rebuild: if True, summary tables are recreated from scratch
+        :type rebuild: bool
+        """
+        with self.session_scope(self.db_engine) as db_session:
+            for rollup in self.rollups:
+                if rebuild:
+                    rollup.rebuild(db_session)
+                else:
+                    rollup.refresh(db_session)
+
+    def get_query_cost(self, db_session, statement):
+        """
+        Returns the total cost of a statement estimated by the database planner.
+        Costs are cached by the compiled statement, so queries that only differ in parameter values are explained once.
+
+        :param db_session: SQLAlchemy session
+        :type db_session: sqlalchemy.orm.Session
+
+        :param statement: statement to explain
+        :type statement: sqlalchemy.sql.expression.Select
+
+        :return: estimated cost or None if the dialect doesn't support it
+        :rtype: float | None
+        """
+        dialect = db_session.get_bind(inspect(self.objects_class)).dialect
+        if dialect.name not in self.EXPLAIN_DIALECTS:
+            return None
+        key = str(statement.compile(dialect=dialect))
+        with self._costs_lock:
+            if key in self._costs:
+                self._costs.move_to_end(key)
+                return self._costs[key]
+        plan = db_session.execute(Explain(statement)).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        cost = float(plan[0]['Plan']['Total Cost'])
+        with self._costs_lock:
+            self._costs[key] = cost
+            if len(self._costs) > self.EXPLAIN_CACHE_SIZE:
+                self._costs.popitem(last=False)
+        return cost
+
+    def check_query_cost(self, db_session, statement):
+        """
+        Rejects the request if the estimated cost of a statement exceeds `max_cost`.
+
+        :param db_session: SQLAlchemy session
+        :type db_session: sqlalchemy.orm.Session
+
+        :param statement: statement to check
+        :type statement: sqlalchemy.sql.expression.Select
+
+        :raises falcon.HTTPBadRequest: if the cost is too high
+        """
+        if self.max_cost is None:
+            return
+        cost = self.get_query_cost(db_session, statement)
+        if cost is not None and cost > self.max_cost:
+            raise HTTPBadRequest('Query too expensive',
+                                 'Estimated query cost {} exceeds the limit of {}, use more selective filters '
+                                 'or fewer totals'.format(cost, self.max_cost))
+
     def get_total_objects(self, queryset, totals):
         if not totals:
             return {}
-        agg_query, dimensions = self._build_total_expressions(queryset, totals)
+        totals, approximate = self._split_approximate_totals(queryset, totals)
+        options = (self.AGGR_GROUPBY, self.AGGR_GROUPLIMIT, self.AGGR_ROLLUP)
+        if approximate and all(aggregate in options for total in totals for aggregate in total):
+            return self._get_approximate_totals(queryset, approximate)
+        rollup_expressions = self._build_rollup_expressions(queryset, totals)
+        if rollup_expressions is not None:
+            agg_query, dimensions = rollup_expressions
+        else:
+            agg_query, dimensions = self._build_total_expressions(queryset, totals)
+        self.check_query_cost(queryset.session, agg_query)
+        approximate_result = self._get_approximate_totals(queryset, approximate) if approximate else {}
 
         def nested_dict(n, type):
             """Creates an n-dimension dictionary where the n-th dimension is of type 'type'
@@ -934,17 +1794,170 @@ class CollectionResource(AlchemyMixin, BaseCollectionResource):
 
         result = nested_dict(len(dimensions) + 2, None)
         for aggs in queryset.session.execute(agg_query):
+            # rows are named tuples since SQLAlchemy 1.4, with the mapping interface moved to _mapping
+            aggs = OrderedDict(aggs._mapping.items() if hasattr(aggs, '_mapping') else aggs.items())
+            # number of dimensions grouped by in a subtotal, the rest has been rolled up
+            level = next((index for index, dimension in enumerate(dimensions)
+                          if aggs.get(self.ROLLUP_GROUPING_PREFIX + dimension)), None)
             for metric_key, metric_value in aggs.items():
-                if metric_key in dimensions:
+                if metric_key in dimensions or metric_key.startswith(self.ROLLUP_GROUPING_PREFIX):
                     continue
                 last_result = result
                 last_key = 'total_' + metric_key
-                for dimension in dimensions:
+                if level is not None:
+                    # subtotals are a list of levels, from the grand total to groups of all but the last dimension
+                    subtotals = result.setdefault(last_key + self.ROLLUP_SUFFIX,
+                                                  [None] + [nested_dict(index + 1, None)
+                                                            for index in range(1, len(dimensions))])
+                    last_result, last_key = subtotals, level
+                for dimension in dimensions[:level]:
                     last_result = last_result[last_key]
                     last_key = str(aggs[dimension])
                 last_result[last_key] = metric_value if not isinstance(metric_value, Decimal) else float(metric_value)
+        result.update(approximate_result)
+        return result
+
+    def _split_approximate_totals(self, queryset, totals):
+        """
+        Separates approximate aggregates not supported natively by the database.
+
+        :param queryset: queryset from :func:`get_queryset`
+        :type queryset: sqlalchemy.orm.query.Query
+
+        :param totals: a list of dicts with aggregate function as key and column as value
+        :type totals: list
+
+        :return: exact totals and approximate totals, the latter also includes group by options
+        :rtype: tuple
+        """
+        approximate_names = [self.AGGR_APPROX_PERCENTILE]
+        if queryset.session.get_bind(inspect(self.objects_class)).dialect.name not in self.APPROX_NATIVE_DIALECTS:
+            approximate_names.append(self.AGGR_APPROX_COUNT_DISTINCT)
+        exact = []
+        approximate = []
+        has_approximate = False
+        for total in totals:
+            exact_total = {key: value for key, value in total.items() if key not in approximate_names}
+            approximate_total = {key: value for key, value in total.items()
+                                 if key in approximate_names or key == self.AGGR_GROUPBY}
+            if exact_total:
+                exact.append(exact_total)
+            if approximate_total:
+                approximate.append(approximate_total)
+            has_approximate = has_approximate or any(key in approximate_names for key in total)
+        return exact, approximate if has_approximate else []
+
+    def _get_approximate_totals(self, queryset, totals):
+        """
+        Calculates approximate aggregates by streaming values through sketches in a single pass.
+        Options like group limit and rollup are ignored, requests with more than :py:const:`APPROX_MAX_GROUPS`
+        groups are rejected.
+
+        :param queryset: queryset from :func:`get_queryset`
+        :type queryset: sqlalchemy.orm.query.Query
+
+        :param totals: a list of dicts with aggregate function as key and column as value
+        :type totals: list
+
+        :return: dict with totals calculated in this query
+        :rtype: dict
+        """
+        mapper = inspect(self.objects_class)
+        relationships = {
+            'aliases': {},
+            'join_chains': [],
+            'prefix': 'totals_',
+        }
+        group_cols = OrderedDict()
+        metrics = []
+        for total in totals:
+            for aggregate, columns in total.items():
+                if not columns:
+                    if aggregate == self.AGGR_GROUPBY:
+                        raise HTTPBadRequest('Invalid attribute', 'Group by option requires at least one column name')
+                    columns = [None]
+                if not isinstance(columns, list):
+                    columns = [columns]
+                for column in columns:
+                    if column is None:
+                        expression = mapper.primary_key[0]
+                    else:
+                        expression = self._parse_tokens(self.objects_class, column.split('__'), None, relationships,
+                                                        lambda c, n, v: n)
+                    if expression is None:
+                        continue
+                    if aggregate == self.AGGR_GROUPBY:
+                        group_cols[column] = expression.label(column)
+                    else:
+                        metrics.append((aggregate, expression.label('{}_{}'.format(aggregate, len(metrics)))))
+        statement = self._apply_joins(queryset, relationships, distinct=False).statement
+        statement = statement.with_only_columns(list(group_cols.values()) + [label for _, label in metrics])\
+            .order_by(None).execution_options(stream_results=True)
+        self.check_query_cost(queryset.session, statement)
+        sketches = OrderedDict()
+        if not group_cols:
+            for index, (aggregate, _) in enumerate(metrics):
+                sketches[(index, ())] = self._new_sketch(aggregate)
+        groups = set()
+        for row in queryset.session.execute(statement):
+            key = tuple(str(row[name]) for name in group_cols)
+            if key not in groups:
+                groups.add(key)
+                if self.APPROX_MAX_GROUPS is not None and len(groups) > self.APPROX_MAX_GROUPS:
+                    raise HTTPBadRequest('Invalid attribute', 'Approximate aggregates can be calculated for at most '
+                                                              '{} groups, use more selective filters or group by '
+                                                              'fewer columns'.format(self.APPROX_MAX_GROUPS))
+            for index, (aggregate, label) in enumerate(metrics):
+                value = row[label.name]
+                if value is None:
+                    continue
+                sketch = sketches.get((index, key))
+                if sketch is None:
+                    sketch = sketches[(index, key)] = self._new_sketch(aggregate)
+                sketch.add(value)
+        result = {}
+        for (index, key), sketch in sketches.items():
+            last_result = result
+            last_key = 'total_' + metrics[index][0]
+            for part in key:
+                last_result = last_result.setdefault(last_key, {})
+                last_key = part
+            last_result[last_key] = self._sketch_result(sketch)
         return result
 
+    def _new_sketch(self, aggregate):
+        if aggregate == self.AGGR_APPROX_COUNT_DISTINCT:
+            return HyperLogLog(self.APPROX_COUNT_DISTINCT_PRECISION)
+        return TDigest(self.APPROX_PERCENTILE_COMPRESSION)
+
+    def _sketch_result(self, sketch):
+        if isinstance(sketch, HyperLogLog):
+            return sketch.estimate()
+        return OrderedDict((str(float(percent)), sketch.percentile(percent)) for percent in self.APPROX_PERCENTS)
+
+    def _build_rollup_expressions(self, queryset, totals):
+        """
+        Looks for a summary table able to answer the totals request. Only unfiltered queries can use them.
+
+        :param queryset: queryset from :func:`get_queryset`
+        :type queryset: sqlalchemy.orm.query.Query
+
+        :param totals: a list of dicts with aggregate function as key and column as value
+        :type totals: list
+
+        :return: aggregate query and dimension names or None if there's no matching summary table
+        :rtype: tuple | None
+        """
+        if not self.rollups or queryset.whereclause is not None:
+            return None
+        if list(queryset.statement.froms) != [inspect(self.objects_class).local_table]:
+            return None
+        for rollup in self.rollups:
+            expressions = rollup.build_total_expressions(totals)
+            if expressions is not None:
+                return expressions
+        return None
+
     def _build_total_expressions(self, queryset, totals):
         mapper = inspect(self.objects_class)
         primary_keys = mapper.primary_key
@@ -957,6 +1970,7 @@ class CollectionResource(AlchemyMixin, BaseCollectionResource):
         group_cols = OrderedDict()
         group_by = []
         group_limit = None
+        rollup = False
         for total in totals:
             for aggregate, columns in total.items():
                 if aggregate == self.AGGR_GROUPLIMIT:
@@ -964,6 +1978,9 @@ class CollectionResource(AlchemyMixin, BaseCollectionResource):
                         raise HTTPBadRequest('Invalid attribute', 'Group limit option requires an integer value')
                     group_limit = columns
                     continue
+                if aggregate == self.AGGR_ROLLUP:
+                    rollup = bool(columns)
+                    continue
                 if not columns:
                     if aggregate == self.AGGR_GROUPBY:
                         raise HTTPBadRequest('Invalid attribute', 'Group by option requires at least one column name')
@@ -984,22 +2001,106 @@ class CollectionResource(AlchemyMixin, BaseCollectionResource):
                         else:
                             aggregates.append(Function(aggregate, expression).label(aggregate))
         agg_query = self._apply_joins(queryset, relationships, distinct=False)
-        group_cols_expr = list(group_cols.values())
+        if rollup and group_by:
+            if group_limit:
+                raise HTTPBadRequest('Invalid attribute', 'Rollup option can\'t be used together with a group limit')
+            native = queryset.session.get_bind(mapper).dialect.name in self.ROLLUP_DIALECTS
+            agg_query = self._rollup_total_query(agg_query.statement, group_cols, aggregates, group_by, native)
+        else:
+            agg_query = self._group_total_query(agg_query.statement, list(group_cols.values()), aggregates, group_by,
+                                                group_limit)
+        return agg_query, list(group_cols.keys())
+
+    @staticmethod
+    def _total_order(group_count, aggregate_count):
+        """
+        Orders by group columns first and then by aggregates in descending order, using column positions.
+        """
+        return text(','.join(list(map(str, range(1, group_count + 1)))
+                             + list(map(lambda c: str(c) + ' DESC', range(1 + group_count,
+                                                                          aggregate_count + group_count + 1)))))
+
+    def _rollup_total_query(self, statement, group_cols, aggregates, group_by, native=True):
+        """
+        Builds an aggregate query returning subtotals for every prefix of group by columns and a grand total.
+        Every row contains a flag for each group by column, named with the `ROLLUP_GROUPING_PREFIX`,
+        set if the column has been rolled up.
+
+        :param statement: a select statement
+        :type statement: sqlalchemy.sql.expression.Select
+
+        :param group_cols: labeled group by expressions indexed by column names
+        :type group_cols: OrderedDict
+
+        :param aggregates: labeled aggregate expressions
+        :type aggregates: list
+
+        :param group_by: group by expressions
+        :type group_by: list
+
+        :param native: if True, use GROUP BY ROLLUP(), otherwise emulate it with UNION ALL of all grouping levels
+        :type native: bool
+
+        :return: aggregate query
+        :rtype: sqlalchemy.sql.expression.Select
+        """
+        names = list(group_cols.keys())
+        order = self._total_order(len(names), len(aggregates))
+        if native:
+            columns = list(group_cols.values()) + aggregates
+            columns += [func.grouping(expression).label(self.ROLLUP_GROUPING_PREFIX + name)
+                        for name, expression in zip(names, group_by)]
+            return statement.with_only_columns(columns).order_by(None).group_by(func.rollup(*group_by))\
+                .order_by(order)
+        levels = []
+        for level in range(len(names), -1, -1):
+            columns = [expression if index < level else null().label(names[index])
+                       for index, expression in enumerate(group_cols.values())]
+            columns += aggregates
+            columns += [literal(0 if index < level else 1).label(self.ROLLUP_GROUPING_PREFIX + name)
+                        for index, name in enumerate(names)]
+            level_query = statement.with_only_columns(columns).order_by(None)
+            if level:
+                level_query = level_query.group_by(*group_by[:level])
+            levels.append(level_query)
+        return union_all(*levels).order_by(order)
+
+    @classmethod
+    def _group_total_query(cls, statement, group_cols_expr, aggregates, group_by, group_limit=None):
+        """
+        Replaces columns of the statement with group by columns and aggregates, sets grouping and ordering.
+
+        :param statement: a select statement
+        :type statement: sqlalchemy.sql.expression.Select
+
+        :param group_cols_expr: labeled group by expressions
+        :type group_cols_expr: list
+
+        :param aggregates: labeled aggregate expressions
+        :type aggregates: list
+
+        :param group_by: group by expressions
+        :type group_by: list
+
+        :param group_limit: max number of items in every group
+        :type group_limit: int | None
+
+        :return: aggregate query
+        :rtype: sqlalchemy.sql.expression.Select
+        """
         columns = group_cols_expr + aggregates
         if group_limit:
             row_order = list(map(lambda c: c.desc(), aggregates))
             columns.append(func.row_number().over(partition_by=group_cols_expr[:-1],
                                                   order_by=row_order).label('row_number'))
-        order = ','.join(list(map(str, range(1, len(group_cols_expr) + 1)))
-                         + list(map(lambda c: str(c) + ' DESC', range(1 + len(group_cols_expr),
-                                                                      len(aggregates) + len(group_cols_expr) + 1))))
-        agg_query = agg_query.statement.with_only_columns(columns).order_by(None).order_by(order)
+        order = cls._total_order(len(group_cols_expr), len(aggregates))
+        agg_query = statement.with_only_columns(columns).order_by(None).order_by(order)
         if group_by:
             agg_query = agg_query.group_by(*group_by)
         if group_limit:
             subquery = agg_query.alias()
             agg_query = select([subquery]).where(subquery.c.row_number <= group_limit)
-        return agg_query, list(group_cols.keys())
+        return agg_query
 
     def get_object_list(self, queryset, limit=None, offset=None):
         if limit is None:
@@ -1014,6 +2115,191 @@ class CollectionResource(AlchemyMixin, BaseCollectionResource):
         offset = max(offset, 0)
         return queryset.offset(offset)
 
+    def is_json_rendered(self, db_session, relations):
+        """
+        Checks if results can be rendered as JSON by the database. Resources overriding :func:`serialize`,
+        :func:`serialize_columns` or :func:`serialize_column`, or setting `serialize_ignore`,
+        always serialize ORM objects instead.
+
+        :param db_session: SQLAlchemy session
+        :type db_session: sqlalchemy.orm.Session
+
+        :param relations: list of relations to include
+        :type relations: list | None
+
+        :rtype: bool
+        """
+        if not self.RENDER_JSON_IN_DB or relations != [] or getattr(self, 'serialize_ignore', None):
+            return False
+        for name in ('serialize', 'serialize_columns', 'serialize_column'):
+            # overrides might be plain methods, unbound from the class
+            method = getattr(type(self), name)
+            if getattr(method, '__func__', method) is not getattr(AlchemyMixin, name).__func__:
+                return False
+        return db_session.get_bind(inspect(self.objects_class)).dialect.name in self.JSON_DIALECTS
+
+    def get_json_results(self, db_session, object_list):
+        """
+        Renders serialized objects as a JSON array in the database, skipping ORM object construction.
+
+        :param db_session: SQLAlchemy session
+        :type db_session: sqlalchemy.orm.Session
+
+        :param object_list: filtered, ordered and paginated query
+        :type object_list: sqlalchemy.orm.query.Query
+
+        :return: the JSON array and number of elements in it
+        :rtype: tuple[str, int]
+        """
+        dialect_name = db_session.get_bind(inspect(self.objects_class)).dialect.name
+        # aggregates don't keep the order of the page, so the position of every row is aggregated in order
+        order_by = object_list.statement._order_by_clause.clauses
+        position = func.row_number().over(order_by=order_by or None).label('_position')
+        page = object_list.enable_eagerloads(False).add_columns(position).subquery()
+        pairs = []
+        for key, column in inspect(self.objects_class).columns.items():
+            value = self.serialize_column_expression(column, page.corresponding_column(column), dialect_name)
+            if value is None:
+                continue
+            pairs.extend([literal(key), value])
+        if dialect_name == 'postgresql':
+            array = cast(func.json_agg(aggregate_order_by(func.json_build_object(*pairs), page.c._position)),
+                         sqltypes.Text)
+            query = select([func.coalesce(array, '[]'), func.count()]).select_from(page)
+        else:
+            # SQLite aggregates rows in the order of an ordered inner select
+            items = select([func.json_object(*pairs).label('item')]).select_from(page).order_by(page.c._position)
+            items = items.alias('items')
+            query = select([func.coalesce(func.json_group_array(func.json(items.c.item)), '[]'), func.count()])
+            query = query.select_from(items)
+        encoded, count = db_session.execute(query).first()
+        return encoded, count
+
+    def is_streamed(self, limit):
+        """
+        Checks if results should be fetched using a server side cursor.
+
+        :param limit: value of the limit param
+        :type limit: int | None
+
+        :rtype: bool
+        """
+        if self.stream_limit is None:
+            return False
+        if limit is None:
+            limit = self.max_limit
+        elif self.max_limit is not None:
+            limit = min(limit, self.max_limit)
+        return limit is None or limit > self.stream_limit
+
+    def serialize_batches(self, db_session, object_list, relations=None, relation_limits=None, relation_counts=None,
+                          included=None):
+        """
+        Fetches objects using a server side cursor and serializes them in batches, removing each batch
+        from the session afterwards, so ORM objects of only one batch are kept in memory at a time.
+
+        :param db_session: SQLAlchemy session
+        :type db_session: sqlalchemy.orm.session.Session
+
+        :param object_list: query from :func:`get_object_list`
+        :type object_list: sqlalchemy.orm.query.Query
+
+        :param relations: relation names to include or None for all relations
+        :type relations: list[str] | None
+
+        :param relation_limits: relation names mapped to a limit and an order, from :func:`split_relation_limits`
+        :type relation_limits: dict | None
+
+        :param relation_counts: names of relations to count, from :func:`get_param_relation_counts`
+        :type relation_counts: list[str] | None
+
+        :param included: if not None, related objects are added to it instead of being embedded in results
+        :type included: dict | None
+
+        :return: serialized objects
+        :rtype: generator
+        """
+        # eager loading collections is not compatible with yield_per, relations are loaded for every batch instead
+        query = object_list.enable_eagerloads(False).yield_per(self.STREAM_BATCH_SIZE)
+        batch = []
+        for obj in query:
+            batch.append(obj)
+            if len(batch) >= self.STREAM_BATCH_SIZE:
+                yield from self._serialize_batch(db_session, batch, relations, relation_limits, relation_counts,
+                                                 included)
+                batch = []
+        if batch:
+            yield from self._serialize_batch(db_session, batch, relations, relation_limits, relation_counts, included)
+
+    def _serialize_batch(self, db_session, batch, relations, relation_limits=None, relation_counts=None,
+                         included=None):
+        mapper = inspect(self.objects_class)
+        if relations is None or len(relations):
+            keys = [mapper.primary_key_from_instance(obj) for obj in batch]
+            if len(mapper.primary_key) == 1:
+                condition = mapper.primary_key[0].in_([key[0] for key in keys])
+            else:
+                condition = or_(*[and_(*[column == value for column, value in zip(mapper.primary_key, key)])
+                                  for key in keys])
+            if relations is None:
+                options = [subqueryload('*')]
+            else:
+                options = [subqueryload(relation) for relation in relations]
+            # objects are already in the identity map, so this only populates their relations
+            db_session.query(self.objects_class).filter(condition).options(*options).all()
+        yield from self.serialize_objects(db_session, batch, relations, relation_limits, relation_counts, included)
+        for obj in batch:
+            db_session.expunge(obj)
+
+    def stream_results(self, db_session, object_list, result, relations=None, relation_limits=None,
+                       relation_counts=None, included=None):
+        """
+        Encodes objects serialized by :func:`serialize_batches` as a JSON response body, one batch at a time,
+        so only one batch of serialized objects is kept in memory. Other keys of the result follow the results,
+        with the number of returned objects and related objects of all results, if normalized.
+
+        :param db_session: SQLAlchemy session
+        :type db_session: sqlalchemy.orm.session.Session
+
+        :param object_list: query from :func:`get_object_list`
+        :type object_list: sqlalchemy.orm.query.Query
+
+        :param result: other keys of the response, like totals
+        :type result: dict
+
+        :param relations: relation names to include or None for all relations
+        :type relations: list[str] | None
+
+        :param relation_limits: relation names mapped to a limit and an order, from :func:`split_relation_limits`
+        :type relation_limits: dict | None
+
+        :param relation_counts: names of relations to count, from :func:`get_param_relation_counts`
+        :type relation_counts: list[str] | None
+
+        :param included: if not None, related objects are added to it instead of being embedded in results
+        :type included: dict | None
+
+        :return: chunks of the response body
+        :rtype: generator
+        """
+        yield b'{"results":['
+        returned = 0
+        batch = []
+        for item in self.serialize_batches(db_session, object_list, relations, relation_limits, relation_counts,
+                                           included):
+            batch.append(json.dumps(item))
+            if len(batch) >= self.STREAM_BATCH_SIZE:
+                yield ((',' if returned else '') + ','.join(batch)).encode('utf-8')
+                returned += len(batch)
+                batch = []
+        if batch:
+            yield ((',' if returned else '') + ','.join(batch)).encode('utf-8')
+            returned += len(batch)
+        result['returned'] = returned
+        if included is not None:
+            result['included'] = included
+        yield ('],' + json.dumps(result)[1:]).encode('utf-8')
+
     def on_get(self, req, resp):
         limit = self.get_param_or_post(req, self.PARAM_LIMIT)
         offset = self.get_param_or_post(req, self.PARAM_OFFSET)
@@ -1024,25 +2310,62 @@ class CollectionResource(AlchemyMixin, BaseCollectionResource):
         totals_params = self.get_param_totals(req)
         # retrieve that param without removing it so self.get_queryset() so it can also use it
         relations = self.clean_relations(self.get_param_or_post(req, self.PARAM_RELATIONS, '', pop_params=False))
-
-        with self.session_scope(self.db_engine) as db_session:
+        relations, relation_limits = self.split_relation_limits(relations)
+        relation_counts = self.get_param_relation_counts(req)
+        included = OrderedDict() if self.get_param_flag(req, self.PARAM_NORMALIZE) else None
+        sample, _ = self.get_param_sample(req, pop_params=False)
+
+        with ExitStack() as scope:
+            db_session = scope.enter_context(self.session_scope(self.get_db_engine(req)))
+            json_rendered = not relation_limits and not relation_counts and self.is_json_rendered(db_session, relations)
+            if json_rendered and included is not None:
+                raise HTTPBadRequest('Invalid attribute', '{} attribute requires relations when results are rendered '
+                                                          'by the database'.format(self.PARAM_NORMALIZE))
             query = self.get_queryset(req, resp, db_session, limit)
-            totals = self.get_total_objects(query, totals_params)
-
             object_list = self.get_object_list(query, limit, offset)
+            # rejects expensive requests before running any query
+            self.check_query_cost(db_session, object_list.statement)
+            totals = self.get_total_objects(query, totals_params)
 
-            serialized = [self.serialize(obj, relations_include=relations,
-                                         relations_ignore=list(getattr(self, 'serialize_ignore', [])))
-                          for obj in object_list]
+            encoded = None
+            chunks = None
+            if json_rendered:
+                encoded, returned = self.get_json_results(db_session, object_list)
+                result = {}
+            elif self.STREAM_RESPONSE and self.is_streamed(limit):
+                returned = None
+                result = {}
+                chunks = self.stream_results(db_session, object_list, result, relations, relation_limits,
+                                             relation_counts, included)
+            else:
+                if self.is_streamed(limit):
+                    serialized = list(self.serialize_batches(db_session, object_list, relations, relation_limits,
+                                                             relation_counts, included))
+                else:
+                    serialized = self.serialize_objects(db_session, list(object_list), relations, relation_limits,
+                                                        relation_counts, included)
+                returned = len(serialized)  # avoid calling object_list.count() which executes the query again
+                result = {'results': serialized}
+                if included is not None:
+                    result['included'] = included
             total_count = totals.get('total_count')
-            result = {'results': serialized,
-                      'total': total_count,
-                      'returned': len(serialized)}  # avoid calling object_list.count() which executes the query again
+            result.update({'total': total_count,
+                           'returned': returned})
+            if sample is not None:
+                result[self.PARAM_SAMPLE] = sample
             result.update(totals)
+            if chunks is not None:
+                # the session is closed after the response is sent, the number of results is not known before
+                resp.stream = ClosingStream(chunks, scope.pop_all())
+                resp.set_header('x-api-total', str(total_count) if isinstance(total_count, int) else '')
+                resp.status = falcon.HTTP_OK
+                return
 
         headers = {'x-api-total': str(total_count) if isinstance(total_count, int) else '',
                    'x-api-returned': str(result['returned'])}
         resp.set_headers(headers)
+        if encoded is not None:
+            result = RawJSON.from_parts(result, {'results': encoded})
         self.render_response(result, req, resp)
 
     def on_head(self, req, resp):
@@ -1054,7 +2377,7 @@ class CollectionResource(AlchemyMixin, BaseCollectionResource):
             offset = int(offset)
         totals = self.get_param_totals(req)
 
-        with self.session_scope(self.db_engine) as db_session:
+        with self.session_scope(self.get_db_engine(req)) as db_session:
             query = self.get_queryset(req, resp, db_session, limit)
             totals = self.get_total_objects(query, totals)
 
@@ -1101,7 +2424,7 @@ class CollectionResource(AlchemyMixin, BaseCollectionResource):
             return
 
         try:
-            with self.session_scope(self.db_engine) as db_session:
+            with self.session_scope(self.get_db_engine(req)) as db_session:
                 result = self.create(req, resp, data, db_session=db_session)
         except IntegrityError:
             raise HTTPConflict('Conflict', 'Unique constraint violated')
@@ -1116,6 +2439,252 @@ class CollectionResource(AlchemyMixin, BaseCollectionResource):
         self.render_response(result, req, resp, status_code)
 
 
+class ShardedCollectionResource(CollectionResource):
+    """
+    A collection resource with rows distributed across many databases by the value of a shard key column.
+    Requests filtering by the shard key (exact or `in`) are sent only to matching shards, other requests are sent
+    to all shards concurrently and results are merged: sorted by the requested order, paginated and with totals
+    combined. Ordering is limited to columns of the resource and only `count`, `sum`, `min` and `max` totals
+    without a group limit can be combined. The `normalize` and `sample` params are not supported for such requests.
+    """
+    MERGEABLE_AGGREGATES = Rollup.MERGEABLE_AGGREGATES
+
+    def __init__(self, objects_class, shards, shard_key, shard_for=None, max_limit=None, eager_limit=None):
+        """
+        :param objects_class: class represent single element of object lists that suppose to be returned
+
+        :param shards: SQL Alchemy engines by shard name
+        :type shards: dict
+
+        :param shard_key: name of the column used to select a shard
+        :type shard_key: str
+
+        :param shard_for: returns a shard name for a shard key value, received as a string when coming from
+                          query params; by default a CRC32 checksum of the value selects one of sorted shard names
+        :type shard_for: callable | None
+
+        :param max_limit: max limit of elements that suppose to be returned by default
+        :type max_limit: int
+
+        :param eager_limit: if None or the value of limit param is greater than this, subquery eager loading
+                            will be enabled
+        :type eager_limit: int
+        """
+        if not shards:
+            raise ValueError('At least one shard is required')
+        self.shards = OrderedDict(sorted(shards.items()))
+        self.shard_key = shard_key
+        self.shard_for = shard_for if shard_for is not None else self.default_shard_for
+        super(ShardedCollectionResource, self).__init__(objects_class, next(iter(self.shards.values())),
+                                                        max_limit=max_limit, eager_limit=eager_limit,
+                                                        stream_limit=None)
+
+    def default_shard_for(self, value):
+        """
+        :param value: shard key value
+        :return: shard name
+        :rtype: str
+        """
+        names = list(self.shards.keys())
+        return names[zlib.crc32(str(value).encode('utf-8')) % len(names)]
+
+    def get_shards(self, req):
+        """
+        Return names of shards matching shard key filters in a request, or all shards if there are none.
+
+        :param req: Falcon request
+        :type req: falcon.request.Request
+
+        :rtype: list[str]
+        """
+        for name in (self.shard_key, self.shard_key + '__exact'):
+            value = self.get_param_or_post(req, name, pop_params=False)
+            if value is not None and not isinstance(value, (list, dict)):
+                return [self.shard_for(value)]
+        values = self.get_param_or_post(req, self.shard_key + '__in', pop_params=False)
+        if isinstance(values, str):
+            values = values.split(self.MULTIVALUE_SEPARATOR)
+        if values:
+            return sorted(set(self.shard_for(value) for value in values))
+        return list(self.shards.keys())
+
+    def get_db_engine(self, req):
+        shards = self.get_shards(req)
+        if len(shards) != 1:
+            raise HTTPBadRequest('Invalid attribute', 'Value of {} is required'.format(self.shard_key))
+        return self.shards[shards[0]]
+
+    def get_sort_keys(self, order):
+        """
+        Parses the order param into column names and directions used to merge results from many shards.
+
+        :param order: value of the order param
+        :type order: str | list | None
+
+        :return: tuples of an attribute name and a flag set when sorting in descending order
+        :rtype: list[tuple[str, bool]]
+        """
+        mapper = inspect(self.objects_class)
+        if not order:
+            return [(column.key, False) for column in mapper.primary_key]
+        if isinstance(order, str):
+            if order[0] == '[' and order[-1] == ']':
+                try:
+                    order = json.loads(order)
+                except ValueError:
+                    pass
+        if not isinstance(order, list):
+            order = [order]
+        sort_keys = []
+        for criterion in order:
+            name = criterion[1:] if isinstance(criterion, str) and criterion.startswith('-') else criterion
+            if not isinstance(name, str) or name not in mapper.column_attrs:
+                raise HTTPBadRequest('Invalid attribute', 'Ordering by {} is not supported when querying '
+                                                          'many shards'.format(criterion))
+            sort_keys.append((name, criterion != name))
+        return sort_keys
+
+    def check_shard_totals(self, totals):
+        """
+        :param totals: a list of dicts with aggregate function as key and column as value
+        :type totals: list
+
+        :raises falcon.HTTPBadRequest: if totals can't be combined from many shards
+        """
+        options = (self.AGGR_GROUPBY, self.AGGR_ROLLUP)
+        for total in totals:
+            for aggregate in total:
+                if aggregate not in options and aggregate not in self.MERGEABLE_AGGREGATES:
+                    raise HTTPBadRequest('Invalid attribute', 'Aggregate {} is not supported when querying '
+                                                              'many shards'.format(aggregate))
+
+    @classmethod
+    def merge_totals(cls, result, totals):
+        """
+        Combines totals calculated by a single shard into the result.
+
+        :param result: totals combined so far
+        :type result: dict
+
+        :param totals: totals from :func:`get_total_objects`
+        :type totals: dict
+
+        :return: the combined totals
+        :rtype: dict
+        """
+        for key, value in totals.items():
+            aggregate = key[len('total_'):]
+            if aggregate.endswith(cls.ROLLUP_SUFFIX):
+                aggregate = aggregate[:-len(cls.ROLLUP_SUFFIX)]
+            result[key] = cls._merge_total(aggregate, result.get(key), value)
+        return result
+
+    @classmethod
+    def _merge_total(cls, aggregate, old, new):
+        if isinstance(new, dict):
+            merged = OrderedDict(old or {})
+            for key, value in new.items():
+                merged[key] = cls._merge_total(aggregate, merged.get(key), value)
+            return merged
+        if isinstance(new, list):
+            # rollup subtotals, merged level by level
+            return [cls._merge_total(aggregate, old_level, new_level)
+                    for old_level, new_level in zip(old or [None] * len(new), new)]
+        return Rollup._merge_value(aggregate, old, new)
+
+    @staticmethod
+    def merge_results(results, sort_keys):
+        """
+        Sorts serialized objects from many shards. Values are compared in Python, so strings are ordered
+        by code points, which can differ from the collation used by the databases.
+
+        :param results: lists of serialized objects, each sorted by the same criteria
+        :type results: list[list[dict]]
+
+        :param sort_keys: from :func:`get_sort_keys`
+        :type sort_keys: list[tuple[str, bool]]
+
+        :rtype: list[dict]
+        """
+        merged = list(itertools.chain.from_iterable(results))
+        # sort by the least significant key first, sorting is stable; nulls are last in ascending order
+        for name, descending in reversed(sort_keys):
+            merged.sort(key=lambda item: (item.get(name) is None, item.get(name) if item.get(name) is not None else 0),
+                        reverse=descending)
+        return merged
+
+    def _get_shard_results(self, db_session, query, totals, limit, relations, relation_limits, relation_counts):
+        totals = self.get_total_objects(query, totals)
+        # max_limit is applied to the merged page, not to rows of every shard
+        objects = list(query.limit(limit) if limit is not None else query)
+        return self.serialize_objects(db_session, objects, relations, relation_limits, relation_counts), totals
+
+    def on_get(self, req, resp):
+        shards = self.get_shards(req)
+        if len(shards) == 1:
+            return super(ShardedCollectionResource, self).on_get(req, resp)
+
+        limit = self.get_param_or_post(req, self.PARAM_LIMIT)
+        offset = self.get_param_or_post(req, self.PARAM_OFFSET)
+        if limit is not None:
+            limit = max(int(limit), 0)
+        if self.max_limit is not None:
+            limit = self.max_limit if limit is None else min(limit, self.max_limit)
+        offset = max(int(offset), 0) if offset is not None else 0
+        totals_params = self.get_param_totals(req)
+        self.check_shard_totals(totals_params)
+        for name, value in ((self.PARAM_NORMALIZE, self.get_param_flag(req, self.PARAM_NORMALIZE)),
+                            (self.PARAM_SAMPLE, self.get_param_sample(req, pop_params=False)[0])):
+            if value:
+                raise HTTPBadRequest('Invalid attribute', '{} attribute is not supported when querying '
+                                                          'many shards'.format(name))
+        relations = self.clean_relations(self.get_param_or_post(req, self.PARAM_RELATIONS, '', pop_params=False))
+        relations, relation_limits = self.split_relation_limits(relations)
+        relation_counts = self.get_param_relation_counts(req)
+        sort_keys = self.get_sort_keys(self.get_param_or_post(req, self.PARAM_ORDER, pop_params=False))
+        # every shard has to return all rows that could end up on the requested page
+        shard_limit = limit + offset if limit is not None else None
+        params = dict(req.params)
+
+        with ExitStack() as stack:
+            jobs = []
+            for name in shards:
+                db_session = stack.enter_context(self.session_scope(self.shards[name]))
+                # get_queryset() pops params, so every shard gets a fresh copy
+                req.params.clear()
+                req.params.update(params)
+                jobs.append((db_session, self.get_queryset(req, resp, db_session, shard_limit)))
+            with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+                # every shard runs in a copy of the request context, so context variables like statement counters
+                # of the request see its queries
+                futures = [executor.submit(contextvars.copy_context().run, self._get_shard_results, db_session, query,
+                                           totals_params, shard_limit, relations, relation_limits, relation_counts)
+                           for db_session, query in jobs]
+                shard_results = [future.result() for future in futures]
+
+        totals = OrderedDict()
+        for _, shard_totals in shard_results:
+            self.merge_totals(totals, shard_totals)
+        serialized = self.merge_results([results for results, _ in shard_results], sort_keys)
+        serialized = serialized[offset:offset + limit] if limit is not None else serialized[offset:]
+        total_count = totals.get('total_count')
+        result = {'results': serialized,
+                  'total': total_count,
+                  'returned': len(serialized)}
+        result.update(totals)
+
+        resp.set_headers({'x-api-total': str(total_count) if isinstance(total_count, int) else '',
+                          'x-api-returned': str(result['returned'])})
+        self.render_response(result, req, resp)
+
+    def on_head(self, req, resp):
+        if len(self.get_shards(req)) == 1:
+            return super(ShardedCollectionResource, self).on_head(req, resp)
+        self.on_get(req, resp)
+        resp.body = None
+        resp.status = falcon.HTTP_NO_CONTENT
+
+
 class SingleResource(AlchemyMixin, BaseSingleResource):
     """
     Allows to fetch a single resource (GET) and to update (PATCH, PUT) or remove it (DELETE).
@@ -1276,3 +2845,50 @@ class SingleResource(AlchemyMixin, BaseSingleResource):
                 raise
 
         self.render_response(result, req, resp, status_code)
+
+
+class MultiGetResource(AlchemyMixin, BaseMultiGetResource):
+    """
+    Allows to fetch many resources by their primary keys (GET, POST) using a single query.
+    Following params are supported:
+    * ids - primary key values, separated by commas in the query string or a list in the request body
+    * relations - list of relation names to include in the results, uses special value `_all` for all relations
+    Other params filter objects, like in :class:`SingleResource`. Requires a single column primary key.
+    """
+
+    def __init__(self, objects_class, db_engine):
+        """
+        :param objects_class: class represent single element of object lists that suppose to be returned
+
+        :param db_engine: SQL Alchemy engine
+        :type db_engine: sqlalchemy.engine.Engine
+        """
+        super(MultiGetResource, self).__init__(objects_class)
+        self.db_engine = db_engine
+        primary_key = inspect(objects_class).primary_key
+        if len(primary_key) != 1:
+            raise ValueError('{} must have a single column primary key'.format(objects_class.__name__))
+        self.primary_key = primary_key[0]
+
+    def clean_id(self, value):
+        try:
+            python_type = self.primary_key.type.python_type
+        except NotImplementedError:
+            return value
+        return value if isinstance(value, python_type) else python_type(value)
+
+    def get_objects(self, req, resp, ids):
+        relations = self.clean_relations(self.get_param_or_post(req, self.PARAM_RELATIONS, ''))
+        with self.session_scope(self.db_engine) as db_session:
+            query = db_session.query(self.objects_class).filter(self.primary_key.in_(ids))
+            # relations of all objects are loaded using one query for every relation
+            if relations is None:
+                query = query.options(selectinload('*'))
+            else:
+                query = query.options(*[selectinload(relation) for relation in relations])
+            query = self.filter_by(query, dict(req.params))
+
+            mapper = inspect(self.objects_class)
+            return {mapper.primary_key_from_instance(obj)[0]: self.serialize(
+                obj, relations_include=relations, relations_ignore=list(getattr(self, 'serialize_ignore', [])))
+                for obj in query}
@@ -0,0 +1,128 @@
+"""
+Resources for Falcon ASGI apps, using SQLAlchemy async engines. Requires SQLAlchemy 1.4 or newer.
+
+All filtering, ordering, totals and serialization logic of :mod:`falcon_dbapi.resources.sqlalchemy` is reused:
+responders of the sync resources are run in a greenlet, where the sync facade of an async engine
+waits for the async driver without blocking the event loop.
+"""
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.util import greenlet_spawn
+
+from falcon_dbapi.resources.sqlalchemy import CollectionResource, SingleResource, MultiGetResource
+
+
+class AsyncAlchemyMixin(object):
+    """
+    Runs responders of sync resources in a greenlet.
+    """
+    @staticmethod
+    def get_sync_engine(db_engine):
+        """
+        :param db_engine: SQLAlchemy async engine
+        :type db_engine: sqlalchemy.ext.asyncio.AsyncEngine
+
+        :return: the sync facade of the engine, usable only in a greenlet
+        :rtype: sqlalchemy.engine.Engine
+        """
+        if not isinstance(db_engine, AsyncEngine):
+            raise ValueError('An async engine is required, use sqlalchemy.ext.asyncio.create_async_engine()')
+        return db_engine.sync_engine
+
+    async def run_sync(self, responder, req, resp, *args, **kwargs):
+        """
+        :param responder: a responder of a sync resource
+
+        :param req: Falcon request
+        :type req: falcon.asgi.Request
+
+        :param resp: Falcon response
+        :type resp: falcon.asgi.Response
+        """
+        return await greenlet_spawn(responder, req, resp, *args, **kwargs)
+
+    async def on_options(self, req, resp, **kwargs):
+        await self.run_sync(super(AsyncAlchemyMixin, self).on_options, req, resp, **kwargs)
+
+
+class AsyncCollectionResource(AsyncAlchemyMixin, CollectionResource):
+    """
+    Same as :class:`falcon_dbapi.resources.sqlalchemy.CollectionResource`, for ASGI apps.
+    Streamed results are serialized in batches, but the response is built in memory,
+    because the session can't be used outside of the responder.
+    """
+    STREAM_RESPONSE = False
+
+    def __init__(self, objects_class, db_engine, **kwargs):
+        """
+        :param objects_class: class represent single element of object lists that suppose to be returned
+
+        :param db_engine: SQLAlchemy async engine
+        :type db_engine: sqlalchemy.ext.asyncio.AsyncEngine
+
+        :param kwargs: other arguments of :class:`falcon_dbapi.resources.sqlalchemy.CollectionResource`
+        """
+        super(AsyncCollectionResource, self).__init__(objects_class, self.get_sync_engine(db_engine), **kwargs)
+        self.async_engine = db_engine
+
+    async def on_get(self, req, resp):
+        await self.run_sync(super(AsyncCollectionResource, self).on_get, req, resp)
+
+    async def on_head(self, req, resp):
+        await self.run_sync(super(AsyncCollectionResource, self).on_head, req, resp)
+
+    async def on_post(self, req, resp, *args, **kwargs):
+        await self.run_sync(super(AsyncCollectionResource, self).on_post, req, resp, *args, **kwargs)
+
+    async def on_put(self, req, resp, *args, **kwargs):
+        await self.run_sync(super(AsyncCollectionResource, self).on_put, req, resp, *args, **kwargs)
+
+
+class AsyncSingleResource(AsyncAlchemyMixin, SingleResource):
+    """
+    Same as :class:`falcon_dbapi.resources.sqlalchemy.SingleResource`, for ASGI apps.
+    """
+    def __init__(self, objects_class, db_engine):
+        """
+        :param objects_class: class represent single element of object lists that suppose to be returned
+
+        :param db_engine: SQLAlchemy async engine
+        :type db_engine: sqlalchemy.ext.asyncio.AsyncEngine
+        """
+        super(AsyncSingleResource, self).__init__(objects_class, self.get_sync_engine(db_engine))
+        self.async_engine = db_engine
+
+    async def on_get(self, req, resp, *args, **kwargs):
+        await self.run_sync(super(AsyncSingleResource, self).on_get, req, resp, *args, **kwargs)
+
+    async def on_head(self, req, resp, *args, **kwargs):
+        await self.run_sync(super(AsyncSingleResource, self).on_head, req, resp, *args, **kwargs)
+
+    async def on_delete(self, req, resp, *args, **kwargs):
+        await self.run_sync(super(AsyncSingleResource, self).on_delete, req, resp, *args, **kwargs)
+
+    async def on_put(self, req, resp, *args, **kwargs):
+        await self.run_sync(super(AsyncSingleResource, self).on_put, req, resp, *args, **kwargs)
+
+    async def on_patch(self, req, resp, *args, **kwargs):
+        await self.run_sync(super(AsyncSingleResource, self).on_patch, req, resp, *args, **kwargs)
+
+
+class AsyncMultiGetResource(AsyncAlchemyMixin, MultiGetResource):
+    """
+    Same as :class:`falcon_dbapi.resources.sqlalchemy.MultiGetResource`, for ASGI apps.
+    """
+    def __init__(self, objects_class, db_engine):
+        """
+        :param objects_class: class represent single element of object lists that suppose to be returned
+
+        :param db_engine: SQLAlchemy async engine
+        :type db_engine: sqlalchemy.ext.asyncio.AsyncEngine
+        """
+        super(AsyncMultiGetResource, self).__init__(objects_class, self.get_sync_engine(db_engine))
+        self.async_engine = db_engine
+
+    async def on_get(self, req, resp, *args, **kwargs):
+        await self.run_sync(super(AsyncMultiGetResource, self).on_get, req, resp, *args, **kwargs)
+
+    async def on_post(self, req, resp, *args, **kwargs):
+        await self.run_sync(super(AsyncMultiGetResource, self).on_post, req, resp, *args, **kwargs)
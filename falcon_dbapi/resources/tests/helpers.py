@@ -0,0 +1,17 @@
+from falcon import Request
+from falcon.testing import create_environ
+
+
+def make_request(query_string='', **kwargs):
+    """
+    :param query_string: query string of the request
+    :type query_string: str
+
+    :param kwargs: other arguments of :func:`falcon.testing.create_environ`, like `method` or `body`
+
+    :return: request with an empty context, like one passed to responders
+    :rtype: falcon.request.Request
+    """
+    req = Request(create_environ(query_string=query_string, **kwargs))
+    req.context = {}
+    return req
@@ -1,12 +1,23 @@
+import copy
 import json
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
+import falcon
 import pytest
-
-from falcon_dbapi.resources.elasticsearch import CollectionResource, ElasticSearchMixin
-from elasticsearch import Elasticsearch
+from falcon import HTTPBadRequest, Response
+
+from falcon_dbapi.middlewares.json_middleware import JSONTranslator
+from falcon_dbapi.resources.base import RawJSON
+from falcon_dbapi.resources.elasticsearch import CollectionResource, SingleResource, MultiGetResource, \
+    ElasticSearchMixin, split_sources
+from falcon_dbapi.resources.tests.helpers import make_request
+from elasticsearch import ConflictError, Elasticsearch
+from elasticsearch.serializer import JSONSerializer
 from elasticsearch_dsl import DocType, InnerObjectWrapper, String, Integer, Nested
 from elasticsearch_dsl import Search
+from elasticsearch_dsl.connections import connections
+from elasticsearch_dsl.result import Response as SearchResponse
 
 
 class OtherModel(InnerObjectWrapper):
@@ -33,11 +44,39 @@ class Model(DocType):
         return {'match': {column_name: tq}}
 
 
+class FakeTransport(object):
+    serializer = JSONSerializer()
+
+    def __init__(self, client):
+        self.client = client
+
+    def get_connection(self):
+        return self.client
+
+
+class FakeElasticsearch(object):
+    """
+    Low-level client without a cluster, tests set the API methods they call, like `bulk` or `mget`,
+    and append their arguments to `requests`.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.transport = FakeTransport(self)
+
+
 @pytest.fixture()
 def connection():
     return Elasticsearch('localhost')
 
 
+@pytest.fixture()
+def fake_es(monkeypatch):
+    es = FakeElasticsearch()
+    monkeypatch.setattr(connections, 'get_connection', lambda alias: es)
+    return es
+
+
 @pytest.fixture(params=[
     ({'name__exact': 'value'},
      """{"term": {"name": "value"}}"""),
@@ -153,6 +192,16 @@ def query_ordered(request):
          "query": {"match_all": {}}}"""),
 
 
+    ("""[{"approx_count_distinct": ["name"]},
+         {"approx_percentile": ["id"]},
+         {"group_by": ["other_models__name"]}]""",
+     """{"aggs": {"nested": {"nested": {"path": "other_models"},
+                             "aggs": {"other_models__name": {"terms": {"field": "other_models.name.raw",
+                                                                       "size": 0,
+                                                                       "order": {"approx_count_distinct": "desc"}},
+                                                             "aggs": {"approx_count_distinct": {"cardinality": {"field": "name", "precision_threshold": 3000}},
+                                                                      "approx_percentile": {"percentiles": {"field": "id", "percents": [50, 95, 99], "compression": 100}}} }} }},
+         "query": {"match_all": {}}}"""),  # noqa
     ("""[{"max": ["other_models__id"]},
          {"group_by": [{"other_models__id__gte": 5}, "other_models__name"]}]""",
      """{"aggs": {"nested": {"nested": {"path": "other_models"},
@@ -237,3 +286,438 @@ def test_flatten_aggregates():
     assert result_key == 'avg'
     assert result_value == {'2017-02-27T00:00:00.000Z': 0.3355697842935721,
                             '2017-03-27T00:00:00.000Z': 0.4355697842935721}
+
+
+def test_flatten_aggregates_percentiles():
+    value = """
+{"buckets":[
+  {"key":"a",
+   "doc_count":3,
+   "approx_percentile":{"values":{"50.0":2.0,"95.0":3.0}}}
+]}
+"""
+    result_key, result_value = CollectionResource.flatten_aggregate('foo', json.loads(value))
+    assert result_key == 'approx_percentile'
+    assert result_value == {'a': {'50.0': 2.0, '95.0': 3.0}}
+
+
+def test_sample_by(connection):
+    """
+    Test `sample_by` func
+    """
+    c = CollectionResource(objects_class=Model, connection=connection)
+    query_obj = c.filter_by(Search(using=connection).doc_type(Model), {'name': 'value'})
+    query_obj = c.sample_by(query_obj, 1, seed=5)
+    assert query_obj.to_dict() == {'query': {'function_score': {'query': {'term': {'name': 'value'}},
+                                                                'functions': [{'random_score': {'seed': 5}}],
+                                                                'boost_mode': 'replace'}},
+                                   'min_score': 0.99}
+
+
+def test_filter_complexity(connection):
+    """
+    Test `filter_by` func rejecting filters exceeding complexity limits
+    """
+    c = CollectionResource(objects_class=Model, connection=connection)
+    # limits are disabled by default
+    c.filter_by(Search(using=connection, doc_type=Model), {'or': {'and': {'not': {'id__in': list(range(200))}}}})
+    c.MAX_FILTER_DEPTH = 2
+    c.MAX_FILTER_CONDITIONS = 2
+    c.MAX_FILTER_JOINS = 0
+    c.MAX_FILTER_VALUES = 2
+    c.filter_by(Search(using=connection, doc_type=Model), {'or': [{'and': {'id': 1}}, {'name': 'a'}]})
+    for conditions in ({'or': {'and': {'not': {'id': 1}}}},
+                       {'id': 1, 'name': 'a', 'or': [{'id': 2}]},
+                       {'id__in': [1, 2, 3]},
+                       {'other_models__name': 'a'}):
+        with pytest.raises(HTTPBadRequest):
+            c.filter_by(Search(using=connection, doc_type=Model), conditions)
+
+
+def test_get_data_single_search(connection, monkeypatch):
+    """
+    Test `get_data` func fetching hits and totals in a single search request
+    """
+    searches = []
+
+    def execute(search, ignore_cache=False):
+        searches.append(search.to_dict())
+        return SearchResponse({'hits': {'total': {'value': 7, 'relation': 'eq'},
+                                        'hits': [{'_source': {'id': 1, 'name': 'model'}}]},
+                               'aggregations': {'max': {'value': 5}}})
+    monkeypatch.setattr(Search, 'execute', execute)
+
+    c = CollectionResource(objects_class=Model, connection=connection)
+    req = make_request('limit=1&offset=2&totals=[{"max":"id"}]')
+    object_list, totals = c.get_data(req, Response())
+    assert object_list == [{'id': 1, 'name': 'model'}]
+    assert totals == {'total_max': 5, 'total_count': 7}
+    assert searches == [{'query': {'match_all': {}}, 'from': 2, 'size': 1,
+                         'aggs': {'max': {'max': {'field': 'id'}}}}]
+
+    del searches[:]
+    req = make_request('limit=0&sample=10&totals=[{"max":"id"}]')
+    object_list, totals = c.get_data(req, Response())
+    assert object_list is None
+    assert len(searches) == 1
+    assert searches[0]['size'] == 0
+    assert searches[0]['min_score'] == 0.9
+
+
+def test_on_get_cursor(connection, monkeypatch, fake_es):
+    """
+    Test `on_get` func paginating using search_after and a scroll context
+    """
+    searches = []
+
+    def execute(search, ignore_cache=False):
+        searches.append((search.to_dict(), search._params))
+        return SearchResponse({'_scroll_id': 'abc',
+                               'hits': {'total': 3, 'hits': [{'_source': {'id': 1}, 'sort': ['model', 'model#1']},
+                                                             {'_source': {'id': 2}, 'sort': ['model', 'model#2']}]}})
+    monkeypatch.setattr(Search, 'execute', execute)
+
+    def scroll(scroll_id, scroll):
+        searches.append((scroll_id, scroll))
+        return {'_scroll_id': 'def', 'hits': {'total': 3, 'hits': [{'_source': {'id': 3}}]}}
+    fake_es.scroll = scroll
+    fake_es.clear_scroll = lambda scroll_id: searches.append(scroll_id)
+
+    c = CollectionResource(objects_class=Model, connection=connection)
+    req = make_request('cursor=_start&limit=2&order=name')
+    resp = Response()
+    c.on_get(req, resp)
+    assert resp.body['results'] == [{'id': 1}, {'id': 2}]
+    assert searches[-1][0]['sort'] == ['name', '_uid']
+    assert 'search_after' not in searches[-1][0]
+
+    req = make_request('limit=2&order=name&cursor=' + resp.body['next_cursor'])
+    c.on_get(req, resp)
+    assert searches[-1][0]['search_after'] == ['model', 'model#2']
+    assert searches[-1][0]['from'] == 0
+
+    req = make_request('cursor=_start&scroll=1m&limit=2')
+    c.on_get(req, resp)
+    assert searches[-1][0]['sort'] == ['_doc']
+    assert searches[-1][1] == {'scroll': '1m'}
+
+    req = make_request('total_count=1&cursor=' + resp.body['next_cursor'])
+    c.on_get(req, resp)
+    assert searches[-2:] == [('abc', '1m'), 'def']
+    assert resp.body['results'] == [{'id': 3}]
+    assert resp.body['total'] == 3
+    assert resp.body['next_cursor'] is None
+
+    req = make_request('cursor=invalid')
+    with pytest.raises(HTTPBadRequest):
+        c.on_get(req, resp)
+
+
+def test_resolve_tokens(connection, monkeypatch):
+    """
+    Test `resolve_tokens` func caching resolved filter keys
+    """
+    c = CollectionResource(objects_class=Model, connection=connection)
+    path = c.resolve_tokens(Model, ['other_models', 'name', 'raw', 'exact'])
+    assert path.column_name == 'other_models.name.raw'
+    assert path.nested_name == 'other_models'
+    assert path.operator == 'exact'
+    assert path.nested_count == 1
+    assert c.resolve_tokens(Model, ['other_models', 'name', 'raw', 'exact']) is path
+    assert c.resolve_tokens(Model, ['other_models', 'name'], prefer_raw=True).column_name == 'other_models.name.raw'
+    assert c.resolve_tokens(Model, ['unknown']).error is not None
+
+    c.clear_mapping_cache()
+    assert c.resolve_tokens(Model, ['other_models', 'name', 'raw', 'exact']) is not path
+    path = c.resolve_tokens(Model, ['name'])
+    monkeypatch.setattr(Model._doc_type, 'mapping', copy.deepcopy(Model._doc_type.mapping))
+    assert c.resolve_tokens(Model, ['name']) is not path
+
+    c.MAPPING_CACHE_SIZE = 2
+    keys = [['name'], ['id'], ['other_models', 'name'], ['other_models', 'id'], ['other_models', 'name', 'raw']]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        paths = list(executor.map(lambda i: c.resolve_tokens(Model, keys[i % len(keys)]), range(2000)))
+    assert all(path.error is None for path in paths)
+    assert len(c._mapping_paths) == 2
+
+
+@pytest.mark.parametrize('count', [10, 100, 1000])
+def test_group_nested(count):
+    """
+    Test `_group_nested` func grouping many nested conditions
+    """
+    paths = ['path{}'.format(i) for i in range(count // 10)]
+    expressions = [{'nested': {'path': paths[i // 2 % len(paths)], 'query': {'term': {'id': i}}}} if i % 2 else
+                   {'term': {'name': i}} for i in range(count * 2)]
+    expressions.insert(1, {'nested': {'path': 'single', 'query': {'term': {'id': -1}}}})
+    result = ElasticSearchMixin()._group_nested(expressions, 'must')
+    assert result[:count + 1] == [expressions[0], expressions[1]] + [{'term': {'name': i}}
+                                                                     for i in range(2, count * 2, 2)]
+    groups = result[count + 1:]
+    assert [group['nested']['path'] for group in groups] == paths
+    assert groups[0]['nested']['query']['bool']['must'] == [{'term': {'id': i}} for i in range(1, count * 2, 2)
+                                                            if i // 2 % len(paths) == 0]
+    assert sum(len(group['nested']['query']['bool']['must']) for group in groups) == count
+
+
+def test_totals_composite(connection):
+    """
+    Test `_build_total_expressions` func paging group_by totals using composite aggregations
+    """
+    c = CollectionResource(objects_class=Model, connection=connection)
+    c.COMPOSITE_GROUP_BY = True
+    totals = [{'max': 'id'}, {'group_by': ['name', 'id']}]
+    query_obj = c._build_total_expressions(Search(using=connection).doc_type(Model), totals, {'name': 'a', 'id': 1})
+    assert query_obj.to_dict()['aggs'] == {'group_by': {
+        'composite': {'size': 1000, 'after': {'name': 'a', 'id': 1},
+                      'sources': [{'name': {'terms': {'field': 'name'}}}, {'id': {'terms': {'field': 'id'}}}]},
+        'aggs': {'max': {'max': {'field': 'id'}}}}}
+
+    totals = [{'group_by': 'other_models__name'}]
+    query_obj = c._build_total_expressions(Search(using=connection).doc_type(Model), totals)
+    assert 'composite' not in json.dumps(query_obj.to_dict())
+
+    response = {'hits': {'total': 3},
+                'aggregations': {'group_by': {'after_key': {'name': 'b', 'id': 2},
+                                              'buckets': [{'key': {'name': 'a', 'id': 1}, 'doc_count': 1,
+                                                           'max': {'value': 1}},
+                                                          {'key': {'name': 'a', 'id': 3}, 'doc_count': 1,
+                                                           'max': {'value': 3}},
+                                                          {'key': {'name': 'b', 'id': 2}, 'doc_count': 1,
+                                                           'max': {'value': 2}}]}}}
+    totals = c.get_response_totals(response)
+    assert totals['total_max'] == {'a': {'1': 1, '3': 3}, 'b': {'2': 2}}
+    assert totals['total_count'] == 3
+    assert c.decode_cursor(totals['groups_after'], 'groups_after') == {'name': 'b', 'id': 2}
+
+
+def test_get_data_totals_only(connection, monkeypatch):
+    """
+    Test `get_data` func requesting only totals using a cacheable search
+    """
+    searches = []
+
+    def execute(search, ignore_cache=False):
+        searches.append((search.to_dict(), search._params))
+        return SearchResponse({'hits': {'total': 7, 'hits': []}, 'aggregations': {'max': {'value': 5}}})
+    monkeypatch.setattr(Search, 'execute', execute)
+
+    c = CollectionResource(objects_class=Model, connection=connection)
+    c.PREFERENCE = 'dashboard'
+    req = make_request('limit=0&name=value&order=-id&totals=[{"max":"id"}]')
+    object_list, totals = c.get_data(req, Response())
+    assert object_list is None
+    assert totals == {'total_max': 5, 'total_count': 7}
+    assert searches == [({'query': {'constant_score': {'filter': {'term': {'name': 'value'}}}},
+                          'size': 0, 'aggs': {'max': {'max': {'field': 'id'}}}},
+                         {'preference': 'dashboard', 'request_cache': True})]
+
+
+def test_on_post_bulk(connection, fake_es):
+    """
+    Test `on_post` func indexing a list of documents using the bulk API
+    """
+    def bulk(body, **kwargs):
+        lines = [json.loads(line) for line in body.splitlines()]
+        fake_es.requests.append((lines, kwargs))
+        items = []
+        for action in lines[::2]:
+            action = action['index']
+            if action.get('_id') == 'bad':
+                items.append({'index': {'_id': 'bad', 'status': 400, 'error': 'mapper_parsing_exception'}})
+            else:
+                items.append({'index': {'_id': action.get('_id', 'generated'), 'status': 201}})
+        return {'items': items}
+    fake_es.bulk = bulk
+
+    c = CollectionResource(objects_class=Model, connection=connection)
+    c.BULK_CHUNK_SIZE = 2
+    translator = JSONTranslator()
+
+    body = '\n'.join(json.dumps(doc) for doc in [{'_id': 5, 'name': 'a'}, {'name': 'b'}, 'c', {'_id': 'bad'}])
+    req = make_request('refresh=wait_for', method='POST', body=body, headers={'Content-Type': 'application/x-ndjson'})
+    resp = Response()
+    translator.process_request(req, resp)
+    c.on_post(req, resp)
+    assert resp.status == falcon.HTTP_207
+    assert resp.body == {'results': [{'id': '5', 'status': 201}, {'id': 'generated', 'status': 201},
+                                     {'status': 400, 'error': 'Document must be an object'},
+                                     {'status': 400, 'error': 'mapper_parsing_exception'}]}
+    assert [len(lines) for lines, _ in fake_es.requests] == [4, 2]
+    assert fake_es.requests[0][0][:2] == [{'index': {'_index': 'models', '_type': 'model', '_id': '5'}},
+                                          {'name': 'a'}]
+    assert fake_es.requests[0][1] == {'refresh': 'wait_for'}
+
+    req = make_request('refresh=later', method='POST')
+    req.context = {'doc': [{'name': 'a'}]}
+    with pytest.raises(falcon.HTTPBadRequest):
+        c.on_post(req, resp)
+
+
+def test_on_post_single(connection, fake_es):
+    """
+    Test `on_post` func indexing a single document with its `_id`
+    """
+    def index(**kwargs):
+        fake_es.requests.append(kwargs)
+        return {'_id': kwargs.get('id', 'generated'), '_version': 1, 'created': True}
+    fake_es.index = index
+
+    c = CollectionResource(objects_class=Model, connection=connection)
+    req = make_request('refresh=true', method='POST')
+    req.context = {'doc': {'_id': 5, 'name': 'a'}}
+    resp = Response()
+    c.on_post(req, resp)
+    assert resp.status == falcon.HTTP_CREATED
+    assert resp.body == {'name': 'a'}
+    assert fake_es.requests == [{'index': 'models', 'doc_type': 'model', 'body': {'name': 'a'}, 'id': '5',
+                                 'refresh': 'true'}]
+
+    req = make_request(method='POST')
+    req.context = {'doc': {'name': 'b'}}
+    c.on_post(req, resp)
+    assert fake_es.requests[-1] == {'index': 'models', 'doc_type': 'model', 'body': {'name': 'b'}}
+
+
+def test_on_patch_partial_update(connection, monkeypatch, fake_es):
+    """
+    Test `on_patch` func sending a partial update without fetching the document
+    """
+    def update(**kwargs):
+        fake_es.requests.append(kwargs)
+        if 'if_seq_no' in kwargs['params']:
+            raise ConflictError(409, 'version_conflict_engine_exception', {})
+        return {'_id': kwargs['id'], 'get': {'_source': dict({'id': 5, 'name': 'a'}, **kwargs['body']['doc'])}}
+    fake_es.update = update
+    monkeypatch.setattr(Model, 'get', lambda *args, **kwargs: pytest.fail('document should not be fetched'))
+
+    c = SingleResource(objects_class=Model, connection=connection)
+    req = make_request(method='PATCH')
+    req.context = {'doc': {'name': 'b', 'other_models': None}}
+    resp = Response()
+    c.on_patch(req, resp, id='5')
+    assert resp.status == falcon.HTTP_OK
+    assert resp.body == {'id': 5, 'name': 'b'}
+    assert fake_es.requests == [{'index': 'models', 'doc_type': 'model', 'id': '5',
+                         'body': {'doc': {'name': 'b', 'other_models': None}},
+                         'params': {'retry_on_conflict': 3, '_source': 'true'}}]
+
+    req = make_request('if_seq_no=3&if_primary_term=1', method='PATCH')
+    req.context = {'doc': {'name': 'c'}}
+    with pytest.raises(falcon.HTTPConflict):
+        c.on_patch(req, resp, id='5')
+    assert fake_es.requests[-1]['params'] == {'if_seq_no': '3', 'if_primary_term': '1', '_source': 'true'}
+
+    req = make_request('version=x', method='PATCH')
+    req.context = {'doc': {'name': 'c'}}
+    with pytest.raises(falcon.HTTPBadRequest):
+        c.on_patch(req, resp, id='5')
+
+    class SerializedResource(SingleResource):
+        PATCH_RETURNS_SOURCE = False
+
+        def serialize(self, obj):
+            return dict(super(SerializedResource, self).serialize(obj), serialized=True)
+
+    req = make_request(method='PATCH')
+    req.context = {'doc': {'name': 'c', 'other_models': None}}
+    SerializedResource(objects_class=Model, connection=connection).on_patch(req, resp, id='5')
+    assert resp.body == {'name': 'c', 'other_models': None, 'serialized': True}
+
+    class UpdatedResource(SingleResource):
+        def update(self, req, resp, data, obj):
+            return {'previous': obj.name}
+
+    monkeypatch.setattr(Model, 'get', lambda *args, **kwargs: Model(name='a'))
+    req = make_request(method='PATCH')
+    req.context = {'doc': {'name': 'd'}}
+    count = len(fake_es.requests)
+    UpdatedResource(objects_class=Model, connection=connection).on_patch(req, resp, id='5')
+    assert resp.body == {'previous': 'a'}
+    assert len(fake_es.requests) == count
+
+
+def test_multi_get(connection, fake_es):
+    """
+    Test `MultiGetResource` fetching documents in the requested order using a single mget request
+    """
+    def mget(body, **kwargs):
+        fake_es.requests.append((body, kwargs))
+        return {'docs': [{'_index': 'models', '_type': 'model', '_id': doc['_id'], 'found': doc['_id'] != '7',
+                          '_source': {'id': int(doc['_id']), 'name': 'model' + doc['_id']}}
+                         for doc in body['docs']]}
+    fake_es.mget = mget
+
+    c = MultiGetResource(objects_class=Model, connection=connection)
+    req = make_request('ids=5,7,3,5')
+    resp = Response()
+    c.on_get(req, resp)
+    assert resp.body == {'results': [{'id': 5, 'name': 'model5'}, None, {'id': 3, 'name': 'model3'},
+                                     {'id': 5, 'name': 'model5'}]}
+    assert fake_es.requests == [({'docs': [{'_id': '5'}, {'_id': '7'}, {'_id': '3'}]},
+                         {'index': 'models', 'doc_type': 'model'})]
+
+
+def test_split_sources():
+    """
+    Test `split_sources` func separating encoded sources of hits from the rest of a search response
+    """
+    raw = ('{"hits":{"total":{"value":2,"relation":"eq"},"hits":[{"_source":{"id":1,"name":"a]},\\"_source\\":"}},'
+           '{"_source":{"id":2,"tags":[]}}]},"aggregations":{"max":{"value":2.0}}}')
+    sources, response = split_sources(raw, aggregations=True)
+    assert [json.loads(source) for source in sources] == [{'id': 1, 'name': 'a]},"_source":'}, {'id': 2, 'tags': []}]
+    assert response == {'hits': {'total': {'value': 2, 'relation': 'eq'}}, 'aggregations': {'max': {'value': 2.0}}}
+
+    sources, response = split_sources('{"hits":{"total":1,"hits":[{"_source":{"id":1}}]}}')
+    assert sources == ['{"id":1}']
+    assert response == {'hits': {'total': 1}}
+    assert split_sources('{"hits":{"total":0},"aggregations":{"max":{"value":null}}}', aggregations=True) == \
+        ([], {'hits': {'total': 0}, 'aggregations': {'max': {'value': None}}})
+    # a nested list of objects with a _source key splits too many hits, detected by comparing with the total
+    sources, _ = split_sources('{"hits":{"total":1,"hits":[{"_source":{"list":[{"a":1},{"_source":2}]}}]}}')
+    assert len(sources) == 2
+    assert split_sources('{"hits":{"total":1,"hits":[{}]}}') is None
+    assert split_sources('{"took":1,"hits":{"total":1}}') is None
+
+
+def test_on_get_raw_source(connection, fake_es):
+    """
+    Test `on_get` func passing encoded sources of hits to the response without decoding them
+    """
+    responses = []
+
+    def perform_request(method, url, params=None, body=None):
+        fake_es.requests.append((method, url, params, json.loads(body.decode('utf-8'))))
+        return 200, {}, responses.pop(0)
+    fake_es.perform_request = perform_request
+
+    c = CollectionResource(objects_class=Model, connection=connection)
+    c.RAW_SOURCE = True
+    translator = JSONTranslator()
+    responses.append('{"hits":{"total":3,"hits":[{"_source":{"id":1,"name":"a"}},{"_source":{"id":2,"name":"b"}}]},'
+                     '"aggregations":{"max":{"value":5.0}}}')
+    req = make_request('limit=2&offset=1&totals=[{"max":"id"}]')
+    resp = Response()
+    c.on_get(req, resp)
+    assert isinstance(resp.body, RawJSON)
+    translator.process_response(req, resp, c, True)
+    assert json.loads(resp.body) == {'results': [{'id': 1, 'name': 'a'}, {'id': 2, 'name': 'b'}],
+                                     'total': 3, 'returned': 2, 'total_max': 5.0}
+    assert resp.get_header('x-api-returned') == '2'
+    method, url, params, body = fake_es.requests[-1]
+    assert (method, url) == ('POST', '/models/model/_search')
+    assert params == {'filter_path': 'hits.total,hits.hits._source,aggregations'}
+    assert body['from'] == 1 and body['size'] == 2
+
+    # a hit without a source doesn't match the total, so the whole response is decoded
+    responses.append('{"hits":{"total":2,"hits":[{"_source":{"id":1}},{}]}}')
+    req = make_request('limit=2')
+    resp = Response()
+    c.on_get(req, resp)
+    assert json.loads(resp.body) == {'results': [{'id': 1}, None], 'total': None, 'returned': 2}
+
+    req = make_request('limit=0')
+    count = len(fake_es.requests)
+    c.on_get(req, resp)
+    assert json.loads(resp.body) == {'results': [], 'total': None, 'returned': 0}
+    assert len(fake_es.requests) == count
@@ -1,14 +1,26 @@
 import json
 from collections import OrderedDict
+from contextlib import contextmanager
+from decimal import Decimal
 
+import falcon
 import pytest
+from falcon import HTTP_400, HTTP_500, HTTPBadRequest, Response
+from falcon import testing
 from sqlalchemy.sql.elements import or_
 from sqlalchemy.sql.functions import Function
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, ForeignKey, Table
-from sqlalchemy.orm import relationship
+from sqlalchemy import create_engine, Column, Integer, Numeric, String, ForeignKey, ForeignKeyConstraint, Table
+from sqlalchemy.orm import relationship, Session
+from sqlalchemy.pool import StaticPool
 
-from falcon_dbapi.resources.sqlalchemy import CollectionResource, AlchemyMixin
+from falcon_dbapi.exceptions import StatementBudgetException
+from falcon_dbapi.middlewares.json_middleware import JSONTranslator
+from falcon_dbapi.middlewares.sql_middleware import StatementCounter
+from falcon_dbapi.resources.sqlalchemy import CollectionResource, MultiGetResource, ShardedCollectionResource, \
+    AlchemyMixin, Explain, Rollup
+from falcon_dbapi.resources.tests.helpers import make_request
 
 Base = declarative_base()
 
@@ -60,16 +72,28 @@ class CompositeModel(Base):
     b_id = Column(Integer, primary_key=True)
     name = Column(String)
 
+    children = relationship('CompositeChildModel', back_populates='parent')
+
+
+class CompositeChildModel(Base):
+    __tablename__ = 'composite_child_table'
+    id = Column(Integer, primary_key=True)
+    a_id = Column(Integer, nullable=False)
+    b_id = Column(Integer, nullable=False)
+    name = Column(String)
+
+    parent = relationship('CompositeModel', back_populates='children')
+
+    __table_args__ = (ForeignKeyConstraint([a_id, b_id], [CompositeModel.a_id, CompositeModel.b_id]),)
+
 
 @pytest.fixture()
 def engine():
-    from sqlalchemy import create_engine
     return create_engine('sqlite:///:memory:', echo=True)
 
 
 @pytest.fixture()
 def session(request, engine):
-    from sqlalchemy.orm import Session
     session = Session(engine)
     Base.metadata.create_all(engine)
 
@@ -273,6 +297,235 @@ FROM composite_table ORDER BY 1 DESC"""
     assert str(stmt.compile(engine)) == expected.replace(' %20', ' ').replace(' %0A\n', ' ')
 
 
+def test_filter_large_in(engine, session):
+    """
+    Test `filter_by` func with more `in` values than `LARGE_IN_THRESHOLD`
+    """
+    session.add_all([Model(id=i, name='model\'{}'.format(i)) for i in range(1, 6)])
+    session.commit()
+    c = CollectionResource(objects_class=Model, db_engine=engine)
+    c.LARGE_IN_THRESHOLD = 2
+    query = c.filter_by(session.query(Model), {'id__in': [1, 2, 3, '4'], 'name__notin': ["model'1", 'x', 'y']})
+    compiled = str(query.statement.compile(engine))
+    assert 'some_table.id IN (1, 2, 3, 4)' in compiled
+    assert 'some_table.name NOT IN (\'model\'\'1\', \'x\', \'y\')' in compiled
+    assert query.count() == 3
+    assert c.exclude_by(session.query(Model), {'id__in': [1, 2, 3]}).count() == 2
+    assert str(query.statement.compile(dialect=postgresql.dialect())).endswith(
+        'WHERE some_table.id = ANY(%(values_1)s::INTEGER[]) AND some_table.name != ALL(%(values_2)s::VARCHAR[])')
+
+    with pytest.raises(HTTPBadRequest):
+        c.filter_by(session.query(Model), {'id__in': [1, 2, 'x']})
+    # values of numeric columns are not converted when deserialized
+    assert c._coerce_numbers(Column('price', Numeric()), ['1.5', None]) == [Decimal('1.5'), None]
+    with pytest.raises(HTTPBadRequest):
+        c._coerce_numbers(Column('price', Numeric()), ['1.5', 'x'])
+
+
+def test_totals_rollup(engine, session):
+    """
+    Test `get_total_objects` func returning subtotals and a grand total
+    """
+    session.add_all([ThirdModel(id=1, other_model_id=2, name='a'), ThirdModel(id=2, other_model_id=2, name='b'),
+                     ThirdModel(id=3, other_model_id=3, name='a')])
+    session.commit()
+    c = CollectionResource(objects_class=ThirdModel, db_engine=engine)
+    totals = [{'count': None}, {'group_by': ['other_model_id', 'name']}, {'rollup': True}]
+    expected = {'total_count': {'2': {'a': 1, 'b': 1}, '3': {'a': 1}},
+                'total_count_rollup': [3, {'2': 2, '3': 1}]}
+    assert c.get_total_objects(session.query(ThirdModel), totals) == expected
+
+    # a group named like a subtotal key doesn't overwrite it
+    session.add(ThirdModel(id=4, other_model_id=3, name='_total'))
+    session.commit()
+    result = c.get_total_objects(session.query(ThirdModel), totals)
+    assert result['total_count']['3'] == {'a': 1, '_total': 1}
+    assert result['total_count_rollup'] == [4, {'2': 2, '3': 2}]
+    assert ShardedCollectionResource.merge_totals(result, {'total_count': {'2': {'c': 1}},
+                                                           'total_count_rollup': [1, {'2': 1}]}) == \
+        {'total_count': {'2': {'a': 1, 'b': 1, 'c': 1}, '3': {'a': 1, '_total': 1}},
+         'total_count_rollup': [5, {'2': 3, '3': 2}]}
+    session.query(ThirdModel).filter(ThirdModel.id == 4).delete()
+    session.commit()
+
+    c.ROLLUP_DIALECTS = ('sqlite',)
+    stmt, _ = c._build_total_expressions(session.query(ThirdModel), totals)
+    expected = """SELECT third_table.other_model_id AS other_model_id, third_table.name AS name, %0A
+count(third_table.id) AS count, grouping(third_table.other_model_id) AS grouping__other_model_id, %0A
+grouping(third_table.name) AS grouping__name %20
+FROM third_table GROUP BY ROLLUP(third_table.other_model_id, third_table.name) ORDER BY 1,2,3 DESC"""
+    assert str(stmt.compile(engine)) == expected.replace(' %20', ' ').replace(' %0A\n', ' ')
+
+
+def test_totals_approximate(engine, session):
+    """
+    Test `get_total_objects` func calculating approximate aggregates using sketches
+    """
+    session.add_all([ThirdModel(id=i, other_model_id=2 + i % 2, name='name' + str(i % 3)) for i in range(1, 11)])
+    session.commit()
+    c = CollectionResource(objects_class=ThirdModel, db_engine=engine)
+    totals = [{'approx_count_distinct': 'name'}, {'approx_percentile': 'id'}, {'count': None}]
+    result = c.get_total_objects(session.query(ThirdModel), totals)
+    assert result['total_count'] == 10
+    assert result['total_approx_count_distinct'] == 3
+    assert result['total_approx_percentile'] == {'50.0': 5.5, '95.0': 10.0, '99.0': 10.0}
+
+    totals = [{'approx_count_distinct': 'name'}, {'group_by': 'other_model_id'}]
+    result = c.get_total_objects(session.query(ThirdModel), totals)
+    assert result == {'total_approx_count_distinct': {'2': 3, '3': 3}}
+
+    c.APPROX_MAX_GROUPS = 2
+    totals = [{'approx_percentile': 'id'}, {'group_by': 'name'}]
+    with pytest.raises(HTTPBadRequest):
+        c.get_total_objects(session.query(ThirdModel), totals)
+
+
+def test_sample(engine, session):
+    """
+    Test `get_sample_expression` func
+    """
+    c = CollectionResource(objects_class=Model, db_engine=engine)
+    expression = c.get_sample_expression(1.5, 7, 'postgresql')
+    expected = """some_table.id IN (SELECT sample_some_table.id %20
+FROM some_table AS sample_some_table TABLESAMPLE system(%(system_1)s) REPEATABLE (%(param_1)s))"""
+    assert str(expression.compile(dialect=postgresql.dialect())) == expected.replace(' %20', ' ')
+
+    expression = c.get_sample_expression(10, 7, 'sqlite')
+    assert str(expression.compile(engine)) == '((((some_table.id % ? + ?) % ?) * ?) % ?) % ? < ?'
+    # large keys don't overflow, SQLite would turn the product into an inexact float
+    large_ids = [2 ** 63 - 1 - i * 7919 for i in range(200)]
+    session.add_all([Model(id=i, name='name') for i in large_ids])
+    session.commit()
+    multiplier = pow(48271, 8, 2147483647)
+    expected = set(i for i in large_ids if (i % 2147483647 + 7) * multiplier % 2147483647 % 10000 < 1000)
+    assert set(row.id for row in session.query(Model).filter(expression)) == expected
+    session.query(Model).delete()
+    session.commit()
+    session.add_all([Model(id=i, name='name') for i in range(1, 1001)])
+    session.commit()
+    sampled = set(row.id for row in session.query(Model).filter(expression))
+    assert 50 < len(sampled) < 150
+    assert set(row.id for row in session.query(Model).filter(c.get_sample_expression(10, 7, 'sqlite'))) == sampled
+    # other seeds select mostly different rows instead of the same rows shifted
+    other = set(row.id for row in session.query(Model).filter(c.get_sample_expression(10, 8, 'sqlite')))
+    assert 50 < len(other) < 150
+    assert len(sampled & other) < 40
+
+    c.get_eager_queryset = lambda req, resp, db_session=None, limit=None: session.query(Model)
+    req = make_request('sample=10&sample_seed=7')
+    assert set(row.id for row in c.get_queryset(req, Response())) == sampled
+
+
+def test_on_get_streamed(engine, session, model):
+    """
+    Test `on_get` func serializing results in batches while sending the response
+    """
+    session.add(model)
+    session.add(Model(id=2, name='model2'))
+    session.commit()
+    c = CollectionResource(objects_class=Model, db_engine=engine, stream_limit=1)
+    c.STREAM_BATCH_SIZE = 1
+    assert c.is_streamed(None)
+    assert not c.is_streamed(1)
+    req = make_request('relations=other_models&total_count=1')
+    resp = Response()
+    c.on_get(req, resp)
+    # results are serialized while the response is sent
+    assert resp.body is None
+    assert resp.headers['x-api-total'] == '2'
+    assert 'x-api-returned' not in resp.headers
+    chunks = list(resp.stream)
+    resp.stream.close()
+    assert len(chunks) == 4
+    body = json.loads(b''.join(chunks).decode('utf-8'))
+    assert body == {'results': [{'id': 1, 'name': 'model',
+                                 'other_models': [{'id': 2, 'name': 'other_model1'},
+                                                  {'id': 3, 'name': 'other_model2'}]},
+                                {'id': 2, 'name': 'model2', 'other_models': []}],
+                    'total': 2, 'returned': 2, 'total_count': 2}
+    assert CollectionResource(objects_class=Model, db_engine=engine).stream_limit is None
+
+    # the session is closed even if the response is not sent
+    closed = []
+    session_scope = c.session_scope
+
+    @contextmanager
+    def tracked_scope(*args, **kwargs):
+        try:
+            with session_scope(*args, **kwargs) as db_session:
+                yield db_session
+        finally:
+            closed.append(True)
+    c.session_scope = tracked_scope
+    req = make_request()
+    c.on_get(req, resp)
+    resp.stream.close()
+    assert closed == [True]
+
+    app = falcon.API(middleware=[JSONTranslator()])
+    app.add_route('/models', CollectionResource(objects_class=Model, db_engine=engine, stream_limit=1))
+    result = testing.TestClient(app).simulate_get('/models', params={'relations': 'other_models', 'normalize': '1'})
+    assert result.json == {'results': [{'id': 1, 'name': 'model', 'other_models': ['2', '3']},
+                                       {'id': 2, 'name': 'model2', 'other_models': []}],
+                           'total': None, 'returned': 2,
+                           'included': {'OtherModel': {'2': {'id': 2, 'name': 'other_model1'},
+                                                       '3': {'id': 3, 'name': 'other_model2'}}}}
+
+
+def test_on_get_streamed_statements(engine, session):
+    """
+    Test `on_get` func loading relations of every batch at once, also for composite primary keys
+    """
+    session.add_all([CompositeModel(a_id=1, b_id=i, name='model',
+                                    children=[CompositeChildModel(id=i * 10 + j, name='child') for j in range(3)])
+                     for i in range(4)])
+    session.commit()
+    counter = StatementCounter(engine, debug=True)
+    c = CollectionResource(objects_class=CompositeModel, db_engine=engine, stream_limit=1)
+    c.STREAM_BATCH_SIZE = 2
+    req = make_request('relations=children')
+    resp = Response()
+    counter.process_request(req, resp)
+    counter.process_resource(req, resp, c, {})
+    c.on_get(req, resp)
+    body = json.loads(b''.join(resp.stream).decode('utf-8'))
+    counter.process_response(req, resp, c, True)
+    assert body['returned'] == 4
+    assert [len(result['children']) for result in body['results']] == [3, 3, 3, 3]
+    # the list query and two queries (objects and their relation) for every batch, no lazy loads
+    assert resp.headers['x-sql-statements'] == '5'
+    assert resp.headers['x-sql-repeated'] == '2'
+
+
+def test_rollup(engine, session):
+    """
+    Test `get_total_objects` func answering totals from a summary table
+    """
+    rollup = Rollup('some_table_by_name', ['name'], [('count', None), ('sum', 'id')], watermark='id')
+    c = CollectionResource(objects_class=Model, db_engine=engine, rollups=[rollup])
+    rollup.table.create(engine)
+    session.add_all([Model(id=1, name='a'), Model(id=2, name='a'), Model(id=3, name='b')])
+    session.commit()
+    assert rollup.refresh(session) == 2
+    session.add(Model(id=4, name='b'))
+    session.commit()
+    assert rollup.refresh(session) == 1
+    assert rollup.refresh(session) == 0
+
+    totals = [{'count': None}, {'sum': 'id'}, {'group_by': 'name'}]
+    stmt, dimensions = c._build_rollup_expressions(session.query(Model), totals)
+    expected = """SELECT some_table_by_name.name AS name, sum(some_table_by_name.count) AS count, %0A
+sum(some_table_by_name.sum__id) AS sum %20
+FROM some_table_by_name GROUP BY some_table_by_name.name ORDER BY 1,2 DESC,3 DESC"""
+    assert str(stmt.compile(engine)) == expected.replace(' %20', ' ').replace(' %0A\n', ' ')
+    assert dimensions == ['name']
+    assert c.get_total_objects(session.query(Model), totals) == {'total_count': {'a': 2, 'b': 2},
+                                                                 'total_sum': {'a': 3, 'b': 7}}
+    # filtered queries and unknown metrics use the base table
+    assert c._build_rollup_expressions(session.query(Model).filter(Model.id > 1), totals) is None
+    assert c._build_rollup_expressions(session.query(Model), [{'max': 'id'}]) is None
+
+
 def test_serialize(model):
     alchemy = AlchemyMixin()
     expected = {
@@ -465,3 +718,336 @@ def test_update_resource2(model, session):
     assert other_model.name == 'other_model1_prim2'
     assert other_model.third_models[0].name == 'third_model1_prim'
     assert other_model.third_models[1].name == 'third_model2'
+
+
+def test_on_get_json_rendered(engine, session, model):
+    """
+    Test `on_get` func rendering results as JSON in the database
+    """
+    session.add(model)
+    session.add(Model(id=2, name='model "2"'))
+    session.commit()
+    c = CollectionResource(objects_class=Model, db_engine=engine)
+    c.RENDER_JSON_IN_DB = True
+    req = make_request('order=-id&limit=5')
+    resp = Response()
+    c.on_get(req, resp)
+    assert isinstance(resp.body, str)
+    assert json.loads(resp.body) == {'results': [{'id': 2, 'name': 'model "2"'}, {'id': 1, 'name': 'model'}],
+                                     'total': None, 'returned': 2}
+    assert resp.headers['x-api-returned'] == '2'
+    assert c.to_char_format(c.DATETIME_FORMAT) == 'YYYY-MM-DD"T"HH24:MI:SS"Z"'
+
+    # rows are aggregated in the requested order
+    session.add_all([Model(id=i, name='model{}'.format(i % 3)) for i in range(3, 10)])
+    session.commit()
+    req = make_request('order=name&order=-id&offset=1&limit=5')
+    c.on_get(req, resp)
+    assert [row['id'] for row in json.loads(resp.body)['results']] == [2, 9, 6, 3, 7]
+
+    # custom serialization uses ORM objects
+    class CustomResource(CollectionResource):
+        @classmethod
+        def serialize_column(cls, column, value):
+            return str(value)
+    c = CustomResource(objects_class=Model, db_engine=engine)
+    c.RENDER_JSON_IN_DB = True
+    assert not c.is_json_rendered(session, [])
+
+    class InstanceResource(CollectionResource):
+        def serialize(self, obj, *args, **kwargs):
+            return {'id': obj.id}
+    c = InstanceResource(objects_class=Model, db_engine=engine)
+    c.RENDER_JSON_IN_DB = True
+    assert not c.is_json_rendered(session, [])
+    req = make_request('order=id&limit=2')
+    c.on_get(req, resp)
+    assert resp.body['results'] == [{'id': 1}, {'id': 2}]
+
+
+def test_query_cost(engine, session):
+    """
+    Test `check_query_cost` func rejecting expensive queries
+    """
+    c = CollectionResource(objects_class=Model, db_engine=engine, max_cost=100)
+    statement = c.filter_by(session.query(Model), {'name__icontains': 'a'}).statement
+    assert str(Explain(statement).compile(dialect=postgresql.dialect())).startswith(
+        'EXPLAIN (FORMAT JSON) SELECT some_table.id, some_table.name')
+    assert c.get_query_cost(session, statement) is None
+    c.check_query_cost(session, statement)
+    c.get_query_cost = lambda db_session, statement: 1000.0
+    with pytest.raises(HTTPBadRequest):
+        c.check_query_cost(session, statement)
+
+    # the list query is checked before running any query, including totals
+    counter = StatementCounter(engine, debug=True)
+    req = make_request('total_count=1')
+    resp = Response()
+    counter.process_request(req, resp)
+    counter.process_resource(req, resp, c, {})
+    with pytest.raises(HTTPBadRequest):
+        c.on_get(req, resp)
+    counter.process_response(req, resp, c, False)
+    assert resp.headers['x-sql-statements'] == '0'
+
+
+def test_filter_complexity(engine, session):
+    """
+    Test `filter_by` func rejecting filters exceeding complexity limits
+    """
+    c = CollectionResource(objects_class=Model, db_engine=engine)
+    c.MAX_FILTER_DEPTH = 2
+    c.MAX_FILTER_CONDITIONS = 2
+    c.MAX_FILTER_JOINS = 1
+    c.MAX_FILTER_VALUES = 2
+    c.filter_by(session.query(Model), {'or': [{'and': {'id': 1}}, {'other_models__name': 'a'}]})
+    for conditions in ({'or': {'and': {'not': {'id': 1}}}},
+                       {'id': 1, 'name': 'a', 'or': [{'id': 2}]},
+                       {'id__in': [1, 2, 3]},
+                       {'other_models__third_models__name': 'a'}):
+        with pytest.raises(HTTPBadRequest):
+            c.filter_by(session.query(Model), conditions)
+    # limits are disabled by default
+    c = CollectionResource(objects_class=Model, db_engine=engine)
+    c.filter_by(session.query(Model), {'or': {'and': {'not': {'other_models__third_models__name': 'a',
+                                                              'id__in': list(range(200))}}}})
+
+
+def test_on_get_relation_limits(engine, session, model):
+    """
+    Test `on_get` func loading only first N elements of a relation
+    """
+    session.add(model)
+    session.add(Model(id=2, name='model2'))
+    session.commit()
+    c = CollectionResource(objects_class=Model, db_engine=engine)
+    req = make_request('relations=other_models:1:-name')
+    resp = Response()
+    c.on_get(req, resp)
+    assert resp.body['results'] == [{'id': 1, 'name': 'model', 'other_models': [{'id': 3, 'name': 'other_model2'}],
+                                     'other_models_omitted': 1},
+                                    {'id': 2, 'name': 'model2', 'other_models': [], 'other_models_omitted': 0}]
+    for relations in ('other_models:0', 'other_models:1:unknown', 'name:1'):
+        with pytest.raises(HTTPBadRequest):
+            c.split_relation_limits([relations])
+
+
+def test_on_get_relation_counts(engine, session, model):
+    """
+    Test `on_get` func counting related objects without loading them
+    """
+    session.add(model)
+    session.add(Model(id=2, name='model2'))
+    session.commit()
+    c = CollectionResource(objects_class=Model, db_engine=engine)
+    req = make_request('relation_counts=other_models')
+    resp = Response()
+    c.on_get(req, resp)
+    assert resp.body['results'] == [{'id': 1, 'name': 'model', 'other_models_count': 2},
+                                    {'id': 2, 'name': 'model2', 'other_models_count': 0}]
+    req = make_request('relation_counts=name')
+    with pytest.raises(HTTPBadRequest):
+        c.on_get(req, Response())
+
+
+def test_on_get_normalized(engine, session, model):
+    """
+    Test `on_get` func returning each related object only once
+    """
+    session.add(model)
+    session.add(Model(id=2, name='model2', other_models=list(model.other_models)))
+    session.commit()
+    c = CollectionResource(objects_class=Model, db_engine=engine)
+    req = make_request('relations=other_models&normalize=1')
+    resp = Response()
+    c.on_get(req, resp)
+    assert resp.body['results'] == [{'id': 1, 'name': 'model', 'other_models': ['2', '3']},
+                                    {'id': 2, 'name': 'model2', 'other_models': ['2', '3']}]
+    assert resp.body['included'] == {'OtherModel': {'2': {'id': 2, 'name': 'other_model1'},
+                                                    '3': {'id': 3, 'name': 'other_model2'}}}
+
+    req = make_request('relations=other_models&normalize=false')
+    c.on_get(req, resp)
+    assert 'included' not in resp.body
+    assert resp.body['results'][0]['other_models'] == [{'id': 2, 'name': 'other_model1'},
+                                                       {'id': 3, 'name': 'other_model2'}]
+    c.RENDER_JSON_IN_DB = True
+    for query_string in ('normalize=maybe', 'normalize=1'):
+        req = make_request(query_string)
+        with pytest.raises(HTTPBadRequest):
+            c.on_get(req, resp)
+
+
+def test_statement_counter(engine, session, model):
+    """
+    Test `StatementCounter` middleware counting statements executed by lazy loaded relations
+    """
+    session.add(model)
+    session.add(Model(id=2, name='model2'))
+    session.commit()
+    counter = StatementCounter(engine, max_repeats=1, debug=True)
+    c = CollectionResource(objects_class=Model, db_engine=engine, eager_limit=10)
+    req = make_request('relations=other_models&limit=5')
+    resp = Response()
+    counter.process_request(req, resp)
+    counter.process_resource(req, resp, c, {})
+    c.on_get(req, resp)
+    counter.process_response(req, resp, c, True)
+    assert resp.headers['x-sql-statements'] == '3'
+    assert resp.headers['x-sql-repeated'] == '2'
+
+    counter.raise_on_budget = True
+    c.max_statements = 2
+    req = make_request('relations=other_models&limit=5')
+    counter.process_request(req, resp)
+    counter.process_resource(req, resp, c, {})
+    with pytest.raises(StatementBudgetException) as error:
+        c.on_get(req, resp)
+    assert error.value.status == HTTP_500
+    counter.process_response(req, resp, c, False)
+
+    counter.debug = False
+    req = make_request('relations=other_models&limit=5')
+    counter.process_request(req, resp)
+    counter.process_resource(req, resp, c, {})
+    with pytest.raises(StatementBudgetException) as error:
+        c.on_get(req, resp)
+    assert error.value.status == HTTP_400
+    counter.process_response(req, resp, c, False)
+
+
+def test_multi_get(engine, session, model):
+    """
+    Test `MultiGetResource` fetching objects in the requested order using one query and one for every relation
+    """
+    session.add(model)
+    session.add(Model(id=2, name='model2'))
+    session.commit()
+    counter = StatementCounter(engine, debug=True)
+    c = MultiGetResource(objects_class=Model, db_engine=engine)
+    req = make_request('ids=2,5,1,2&relations=other_models')
+    resp = Response()
+    counter.process_request(req, resp)
+    counter.process_resource(req, resp, c, {})
+    c.on_get(req, resp)
+    counter.process_response(req, resp, c, True)
+    assert resp.body == {'results': [{'id': 2, 'name': 'model2', 'other_models': []}, None,
+                                     {'id': 1, 'name': 'model', 'other_models': [{'id': 2, 'name': 'other_model1'},
+                                                                                 {'id': 3, 'name': 'other_model2'}]},
+                                     {'id': 2, 'name': 'model2', 'other_models': []}]}
+    assert resp.headers['x-sql-statements'] == '2'
+
+    req = make_request('name=model', method='POST')
+    req.context = {'doc': {'ids': [1, 2]}}
+    c.on_post(req, resp)
+    assert resp.body == {'results': [{'id': 1, 'name': 'model'}, None]}
+
+    for ids in ('ids=a', 'ids=' + ','.join(map(str, range(c.MAX_IDS + 1)))):
+        req = make_request(ids)
+        with pytest.raises(HTTPBadRequest):
+            c.on_get(req, resp)
+    with pytest.raises(ValueError):
+        MultiGetResource(objects_class=CompositeModel, db_engine=engine)
+
+
+def test_sharded_on_get():
+    """
+    Test `ShardedCollectionResource.on_get` func merging results from many shards
+    """
+    shards = {}
+    for name, ids in (('a', [1, 4, 5]), ('b', [2, 3, 6])):
+        shards[name] = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+        Base.metadata.create_all(shards[name])
+        session = Session(shards[name])
+        session.add_all([Model(id=i, name='model{}'.format(i % 2)) for i in ids])
+        session.commit()
+        session.close()
+    c = ShardedCollectionResource(Model, shards, 'id', shard_for=lambda value: 'a' if int(value) in (1, 4, 5) else 'b')
+
+    req = make_request('order=-name&order=id&limit=3&offset=1&total_count=1'
+                       '&totals=[{"sum":"id"},{"max":"id"},{"group_by":"name"}]')
+    resp = Response()
+    c.on_get(req, resp)
+    assert resp.body['results'] == [{'id': 3, 'name': 'model1'}, {'id': 5, 'name': 'model1'},
+                                    {'id': 2, 'name': 'model0'}]
+    assert resp.body['total_count'] == {'model0': 3, 'model1': 3}
+    assert resp.body['total_sum'] == {'model0': 12, 'model1': 9}
+    assert resp.body['total_max'] == {'model0': 6, 'model1': 5}
+
+    req = make_request('id=4')
+    c.on_get(req, resp)
+    assert resp.body['results'] == [{'id': 4, 'name': 'model0'}]
+
+    for query_string in ('totals=[{"avg":"id"}]', 'normalize=1', 'sample=50'):
+        req = make_request(query_string)
+        with pytest.raises(HTTPBadRequest):
+            c.on_get(req, resp)
+
+    # max_limit is applied to the merged page, after skipping the offset
+    c.max_limit = 2
+    req = make_request('offset=4')
+    c.on_get(req, resp)
+    assert resp.body['results'] == [{'id': 5, 'name': 'model1'}, {'id': 6, 'name': 'model0'}]
+    req = make_request('offset=1&limit=5')
+    c.on_get(req, resp)
+    assert [row['id'] for row in resp.body['results']] == [2, 3]
+    c.max_limit = None
+
+    # statements executed by shard threads are counted for the request
+    counters = [StatementCounter(engine) for engine in shards.values()]
+    req = make_request('total_count=1')
+    for counter in counters:
+        counter.process_request(req, resp)
+    c.on_get(req, resp)
+    assert [counter.stats.count for counter in counters] == [2, 2]
+
+
+def test_async_resources(tmpdir):
+    """
+    Test async resources in a Falcon ASGI app
+    """
+    pytest.importorskip('aiosqlite')
+    pytest.importorskip('sqlalchemy.ext.asyncio')
+    falcon_asgi = pytest.importorskip('falcon.asgi')
+    import asyncio
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import NullPool
+    from falcon_dbapi.resources.sqlalchemy_async import AsyncCollectionResource, AsyncSingleResource, \
+        AsyncMultiGetResource
+
+    async_engine = create_async_engine('sqlite+aiosqlite:///{}'.format(tmpdir.join('test.db')), poolclass=NullPool)
+
+    async def create_all():
+        async with async_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(create_all())
+
+    app = falcon_asgi.App(middleware=[JSONTranslator()])
+    app.add_route('/models', AsyncCollectionResource(Model, async_engine))
+    app.add_route('/models/{id}', AsyncSingleResource(Model, async_engine))
+    app.add_route('/multi/models', AsyncMultiGetResource(Model, async_engine))
+    client = testing.TestClient(app)
+
+    result = client.simulate_post('/models', json={'name': 'model1'})
+    assert result.status_code == 201
+    assert result.json == {'id': 1, 'name': 'model1'}
+    result = client.simulate_get('/models', params={'name': 'model1'})
+    assert result.json['results'] == [{'id': 1, 'name': 'model1'}]
+    result = client.simulate_post('/models', json={'name': 'model2'})
+    assert result.status_code == 201
+    result = client.simulate_get('/models', params={'total_count': '1'})
+    assert result.status_code == 200
+    assert result.json['total'] == 2
+    result = client.simulate_get('/models', params={'totals': '[{"max": "id"}, {"group_by": "name"}]'})
+    assert result.json['total_max'] == {'model1': 1, 'model2': 2}
+    result = client.simulate_get('/models/1')
+    assert result.json == {'id': 1, 'name': 'model1'}
+    result = client.simulate_post('/multi/models', json={'ids': [3, 1]})
+    assert result.json == {'results': [None, {'id': 1, 'name': 'model1'}]}
+    loop.close()
+    asyncio.set_event_loop(None)
+
+    with pytest.raises(ValueError):
+        AsyncCollectionResource(Model, object())
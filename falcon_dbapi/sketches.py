@@ -0,0 +1,162 @@
+"""
+Probabilistic data structures used to calculate approximate aggregates in a single streaming pass,
+when the database can't calculate them itself.
+"""
+import hashlib
+import math
+
+
+class HyperLogLog(object):
+    """
+    Estimates number of distinct values, with a standard error of about `1.04 / sqrt(2 ** precision)`.
+    """
+
+    def __init__(self, precision=14):
+        """
+        :param precision: number of bits used to select a register, between 4 and 18
+        :type precision: int
+        """
+        if not 4 <= precision <= 18:
+            raise ValueError('Precision must be between 4 and 18')
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(self.size)
+
+    def add(self, value):
+        """
+        :param value: any value, compared using its string representation
+        """
+        x = int.from_bytes(hashlib.sha1(str(value).encode('utf-8')).digest()[:8], 'big')
+        index = x >> (64 - self.precision)
+        remaining = x & ((1 << (64 - self.precision)) - 1)
+        rank = 64 - self.precision - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        """
+        :param other: a sketch with the same precision
+        :type other: HyperLogLog
+        """
+        if other.precision != self.precision:
+            raise ValueError('Can\'t merge sketches with different precision')
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def estimate(self):
+        """
+        :return: estimated number of distinct values
+        :rtype: int
+        """
+        if self.size == 16:
+            alpha = 0.673
+        elif self.size == 32:
+            alpha = 0.697
+        elif self.size == 64:
+            alpha = 0.709
+        else:
+            alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size * self.size / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.size and zeros:
+            # small range correction, use linear counting
+            estimate = self.size * math.log(self.size / zeros)
+        return int(round(estimate))
+
+
+class TDigest(object):
+    """
+    Estimates quantiles of a distribution using a merging t-digest, accurate mostly at the tails.
+    """
+
+    def __init__(self, compression=100):
+        """
+        :param compression: higher values give more accurate results using more memory
+        :type compression: int
+        """
+        self.compression = compression
+        self.centroids = []
+        self.buffer = []
+        self.buffer_size = int(compression) * 5
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value, weight=1):
+        """
+        :param value: a number
+        :type value: int | float | decimal.Decimal
+
+        :param weight: how many times the value occurred
+        :type weight: int
+        """
+        value = float(value)
+        self.buffer.append((value, weight))
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if len(self.buffer) >= self.buffer_size:
+            self._compress()
+
+    def merge(self, other):
+        """
+        :param other: another digest
+        :type other: TDigest
+        """
+        other._compress()
+        self.buffer.extend(other.centroids)
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+        self._compress()
+
+    def _scale(self, q):
+        return self.compression / (2 * math.pi) * math.asin(2 * min(max(q, 0.0), 1.0) - 1)
+
+    def _compress(self):
+        if not self.buffer:
+            return
+        points = sorted(self.centroids + self.buffer)
+        self.buffer = []
+        total = sum(weight for _, weight in points)
+        merged = []
+        start = 0
+        mean, weight = points[0]
+        for point_mean, point_weight in points[1:]:
+            if self._scale((start + weight + point_weight) / total) - self._scale(start / total) <= 1:
+                weight += point_weight
+                mean += (point_mean - mean) * point_weight / weight
+            else:
+                merged.append((mean, weight))
+                start += weight
+                mean, weight = point_mean, point_weight
+        merged.append((mean, weight))
+        self.centroids = merged
+        self.count = total
+
+    def percentile(self, percent):
+        """
+        :param percent: a number between 0 and 100
+        :type percent: int | float
+
+        :return: estimated value or None if no values were added
+        :rtype: float | None
+        """
+        self._compress()
+        if not self.centroids:
+            return None
+        target = percent / 100.0 * self.count
+        previous_center, previous_mean = 0, self.min
+        cumulative = 0
+        for mean, weight in self.centroids:
+            center = cumulative + weight / 2.0
+            if target < center:
+                if center == previous_center:
+                    return mean
+                return previous_mean + (mean - previous_mean) * (target - previous_center) / (center - previous_center)
+            previous_center, previous_mean = center, mean
+            cumulative += weight
+        if self.count == previous_center:
+            return self.max
+        return previous_mean + (self.max - previous_mean) * (target - previous_center) / (self.count - previous_center)
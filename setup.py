@@ -67,6 +67,13 @@ setup(
     install_requires=[
         'falcon>=1.3.0',
     ],
+    extras_require={
+        # async resources need Falcon ASGI apps and SQLAlchemy async engines
+        'async': [
+            'falcon>=3.0',
+            'SQLAlchemy>=1.4,<2.0',
+        ],
+    },
     include_package_data=True,
     license='MIT',
     classifiers=[
@@ -86,7 +93,7 @@ setup(
     tests_require=[
         'pytest',
         'mongoengine==0.10.6',
-        'SQLAlchemy>=1.0.12',
+        'SQLAlchemy>=1.2',
         'alchemyjsonschema>=0.4.2',
         'elasticsearch-dsl==2.1.0',
         'elasticsearch==2.3.0'